@@ -1,7 +1,8 @@
 'use client';
 
 import { useEffect, useState } from 'react';
-import { collection, getDocs, orderBy, limit, query, startAfter, getCountFromServer, DocumentSnapshot } from 'firebase/firestore';
+import { collection, doc, getDoc, getDocs, onSnapshot, orderBy, limit, query, startAfter, getCountFromServer, DocumentData, DocumentSnapshot } from 'firebase/firestore';
+import { applyChanges, fetchChangesSince } from '@/lib/changefeed';
 import { auth, db } from '@/lib/firebase';
 import { onAuthStateChanged } from 'firebase/auth';
 import { useRouter } from 'next/navigation';
@@ -83,21 +84,47 @@ export default function Page() {
 
   useEffect(() => {
     if (!user || !db) return;
-    // Fetch failed patients
+    // Failed patients: one full load, then the deltas of each sync run from the change feed
+    const failedById = new Map<string, DocumentData>();
+    let appliedSeq = 0;
+
+    const showFailedPatients = () => {
+      const failedData = [...failedById.entries()].map(([id, data]) => ({
+        patient_id: id,
+        species: data.species || '',
+        wrmd_species: data.wrmd_species || '',
+        raw_age: data.raw_age || '',
+        intake_date: data.intake_date || '',
+        last_checked: data.last_checked ? data.last_checked.replace(/ UTC[+-]\d+$/, '') : '',
+        page_number: data.page_number || data.page || 0
+      }));
+      // Same order as the Firestore query: intake_date string, descending
+      failedData.sort((a, b) => (a.intake_date < b.intake_date ? 1 : a.intake_date > b.intake_date ? -1 : 0));
+      setFailedPatients(failedData);
+    };
+
     const fetchFailedPatients = async () => {
       if (!db) return;
+      // Read the feed position first: runs landing during the load are applied again, which is harmless
+      const pointer = await getDoc(doc(db, 'system', 'changefeed'));
+      appliedSeq = pointer.exists() ? pointer.data().latest_seq : 0;
       const failedPatientsQuery = query(collection(db, 'failed_patients'), orderBy('intake_date', 'desc'));
       const failedSnap = await getDocs(failedPatientsQuery);
-      const failedData = failedSnap.docs.map(doc => ({
-        patient_id: doc.id,
-        species: doc.data().species || '',
-        wrmd_species: doc.data().wrmd_species || '',
-        raw_age: doc.data().raw_age || '',
-        intake_date: doc.data().intake_date || '',
-        last_checked: doc.data().last_checked ? doc.data().last_checked.replace(' UTC-7', '') : '',
-        page_number: doc.data().page_number || doc.data().page || 0
-      }));
-      setFailedPatients(failedData);
+      failedById.clear();
+      failedSnap.docs.forEach((d) => failedById.set(d.id, d.data()));
+      showFailedPatients();
+    };
+
+    const applyFeed = async () => {
+      if (!db) return;
+      const result = await fetchChangesSince(db, appliedSeq);
+      if (result.status === 'reload') {
+        await fetchFailedPatients();
+      } else if (result.status === 'deltas') {
+        applyChanges({ failed_patients: failedById }, result.changes);
+        appliedSeq = result.latestSeq;
+        showFailedPatients();
+      }
     };
 
     // Fetch messages
@@ -106,7 +133,22 @@ export default function Page() {
       setLoading(false);
     });
     
-    fetchFailedPatients();
+    let cancelled = false;
+    let unsubFeed = () => {};
+    // Feed reads run one after another so deltas are applied in sequence order; a failed read
+    // falls back to a full load so the queue always settles and later runs still apply
+    let feedQueue = Promise.resolve();
+    fetchFailedPatients().then(() => {
+      if (!db || cancelled) return;
+      unsubFeed = onSnapshot(doc(db, 'system', 'changefeed'), (snap) => {
+        if (snap.exists() && snap.data().latest_seq > appliedSeq) {
+          feedQueue = feedQueue.then(applyFeed).catch((e) => {
+            console.error('Change feed update failed, reloading failed patients', e);
+            return fetchFailedPatients().catch((reloadError) => console.error(reloadError));
+          });
+        }
+      });
+    });
     
     const fetchTotalCount = async () => {
       if (!db) return;
@@ -116,6 +158,11 @@ export default function Page() {
       setTotalPages(Math.ceil(totalCount / pageSize));
     };
     fetchTotalCount();
+
+    return () => {
+      cancelled = true;
+      unsubFeed();
+    };
   }, [user]);
 
   const handleNext = async () => {
@@ -262,7 +309,7 @@ export default function Page() {
               {messages.map((msg, i) => (
                 <tr key={msg.id} style={{ background: i % 2 ? '#f7f7f7' : '#ffffff', color: '#000000' }}>
                   <td style={{ padding: '10px', borderBottom: '1px solid #eee', color: '#000000' }}>
-                    {msg.timestamp ? msg.timestamp.replace(' UTC-7', '') : 'N/A'}
+                    {msg.timestamp ? msg.timestamp.replace(/ UTC[+-]\d+$/, '') : 'N/A'}
                   </td>
                   <td style={{ padding: '10px', borderBottom: '1px solid #eee', color: '#000000' }}>{msg.patient_id ?? 'N/A'}</td>
                   <td style={{ padding: '10px', borderBottom: '1px solid #eee', color: '#000000' }}>{msg.species ?? 'N/A'}</td>
@@ -0,0 +1,85 @@
+// src/lib/changefeed.ts
+// Delta updates published by the scraper after each sync (changefeed/{seq}).
+// A client remembers the last sequence it applied and asks only for newer runs;
+// if it fell out of the retention window it gets a 'reload' result instead.
+import { collection, doc, getDoc, getDocs, orderBy, query, where, DocumentData, Firestore } from 'firebase/firestore';
+
+export type PatientCollection = 'patients_in_care' | 'other_patients' | 'failed_patients';
+
+export interface AddedEntry extends DocumentData {
+  collection: PatientCollection;
+}
+
+export interface MovedEntry extends AddedEntry {
+  from: PatientCollection;
+}
+
+export interface RemovedEntry {
+  collection: PatientCollection;
+  disposition: string;
+}
+
+export interface ChangeFeedDoc {
+  seq: number;
+  run_id: string;
+  full_reload: boolean;
+  added?: Record<string, AddedEntry>;
+  moved?: Record<string, MovedEntry>;
+  updated?: Record<string, AddedEntry>;
+  removed?: Record<string, RemovedEntry>;
+}
+
+export type ChangesSince =
+  | { status: 'up-to-date'; latestSeq: number }
+  | { status: 'deltas'; latestSeq: number; changes: ChangeFeedDoc[] }
+  | { status: 'reload'; latestSeq: number };
+
+export async function fetchChangesSince(db: Firestore, sinceSeq: number): Promise<ChangesSince> {
+  const pointer = await getDoc(doc(db, 'system', 'changefeed'));
+  if (!pointer.exists()) {
+    return { status: 'reload', latestSeq: 0 };
+  }
+  const { latest_seq: latestSeq, oldest_seq: oldestSeq } = pointer.data() as { latest_seq: number; oldest_seq: number };
+
+  if (sinceSeq >= latestSeq) {
+    return { status: 'up-to-date', latestSeq };
+  }
+  // The run right after sinceSeq has already been pruned
+  if (sinceSeq + 1 < oldestSeq) {
+    return { status: 'reload', latestSeq };
+  }
+
+  const snap = await getDocs(query(collection(db, 'changefeed'), where('seq', '>', sinceSeq), orderBy('seq')));
+  const changes = snap.docs.map((d) => d.data() as ChangeFeedDoc);
+
+  // A gap means a run was pruned between the two reads
+  const contiguous = changes.every((change, i) => change.seq === sinceSeq + i + 1);
+  if (!contiguous || changes.some((change) => change.full_reload)) {
+    return { status: 'reload', latestSeq };
+  }
+  return { status: 'deltas', latestSeq: changes.length ? changes[changes.length - 1].seq : latestSeq, changes };
+}
+
+// Applies feed documents in order to per-collection maps of patient data keyed by case number.
+// Collections missing from `collections` are skipped, so a page can track only what it shows.
+export function applyChanges(
+  collections: Partial<Record<PatientCollection, Map<string, DocumentData>>>,
+  changes: ChangeFeedDoc[],
+): void {
+  for (const change of changes) {
+    for (const [patientId, entry] of Object.entries(change.removed ?? {})) {
+      collections[entry.collection]?.delete(patientId);
+    }
+    for (const [patientId, entry] of Object.entries(change.moved ?? {})) {
+      collections[entry.from]?.delete(patientId);
+      collections[entry.collection]?.set(patientId, { ...entry, patient_id: patientId });
+    }
+    for (const [patientId, entry] of Object.entries(change.added ?? {})) {
+      collections[entry.collection]?.set(patientId, { ...entry, patient_id: patientId });
+    }
+    // Rewritten in place; entries carry the whole document
+    for (const [patientId, entry] of Object.entries(change.updated ?? {})) {
+      collections[entry.collection]?.set(patientId, { ...entry, patient_id: patientId });
+    }
+  }
+}
@@ -0,0 +1,112 @@
+# Capacity drift audit.
+# number_in_care on species/{slug}/age/{stage} is only ever moved by update_capacity_count deltas;
+# this recomputes the true values with count() aggregations on patients_in_care (no patient
+# documents are downloaded) and reports, and optionally corrects, any counter that drifted.
+# Usage: python audit_capacity.py [--fix]
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+AUDIT_DOC = ("system", "capacity_audit")
+# Aggregation queries are independent round trips; run a few at a time
+AUDIT_WORKERS = 8
+
+
+def count_in_care(db, species, age_stage):
+    """
+    Server-side count of patients_in_care with this species name and age stage.
+    Billed as one read per 1000 matching index entries.
+    """
+    from google.cloud.firestore_v1.base_query import FieldFilter
+
+    query = (db.collection("patients_in_care")
+             .where(filter=FieldFilter("species", "==", species))
+             .where(filter=FieldFilter("age_stage", "==", age_stage)))
+    return query.count().get()[0][0].value
+
+
+def read_counters(db):
+    """
+    Returns [(age document reference, species name, age stage, recorded number_in_care)]
+    for every species/{slug}/age/{stage} document.
+    """
+    names = {doc.id: doc.to_dict().get("name") for doc in db.collection("species").stream()}
+    counters = []
+    for doc in db.collection_group("age").stream():
+        data = doc.to_dict()
+        species_slug = doc.reference.parent.parent.id
+        name = names.get(species_slug)
+        if name is None or not data.get("age"):
+            print(f"⚠️ Skipping counter without species name or age: species/{species_slug}/age/{doc.id}")
+            continue
+        counters.append((doc.reference, name, data["age"], data.get("number_in_care") or 0))
+    return counters
+
+
+def audit_capacity(db, fix=False):
+    """
+    Compares every number_in_care counter with the live count of patients_in_care and
+    records the result in system/capacity_audit.
+    With fix=True all drifted counters are overwritten with the live counts in one batch.
+    Run it when no sync is writing, e.g. right after one.
+    Returns the audit document.
+    """
+    counters = read_counters(db)
+    with ThreadPoolExecutor(max_workers=AUDIT_WORKERS) as pool:
+        actual = list(pool.map(lambda counter: count_in_care(db, counter[1], counter[2]), counters))
+    total = db.collection("patients_in_care").count().get()[0][0].value
+
+    drift, drifted_refs = [], []
+    for (ref, species, age_stage, recorded), count in zip(counters, actual):
+        if recorded != count:
+            drifted_refs.append(ref)
+            drift.append({
+                "species_slug": ref.parent.parent.id,
+                "age": ref.id,
+                "species": species,
+                "age_stage": age_stage,
+                "recorded": recorded,
+                "actual": count,
+            })
+
+    if fix and drift:
+        batch = db.batch()
+        for ref, entry in zip(drifted_refs, drift):
+            batch.update(ref, {"number_in_care": entry["actual"]})
+        batch.commit()
+
+    report = {
+        "checked_at": datetime.now(timezone.utc),
+        "counters": len(counters),
+        "patients_in_care": total,
+        # Patients in care whose species/age stage has no counter document
+        "unmatched": total - sum(actual),
+        "drift": drift,
+        "fixed": bool(fix and drift),
+    }
+    db.collection(AUDIT_DOC[0]).document(AUDIT_DOC[1]).set(report)
+
+    for entry in drift:
+        print(f"⚖️ {entry['species']} / {entry['age_stage']}: counter {entry['recorded']}, "
+              f"in care {entry['actual']} ({entry['actual'] - entry['recorded']:+d})"
+              + (" - corrected" if report["fixed"] else ""))
+    if report["unmatched"]:
+        print(f"⚠️ {report['unmatched']} patients in care have no matching capacity counter")
+    print(f"⚖️ Capacity audit: {len(counters)} counters, {len(drift)} drifted"
+          + (", corrected" if report["fixed"] else ""))
+    return report
+
+
+def main():
+    from firebase_setup import initialize_firestore
+
+    parser = argparse.ArgumentParser(description="Check number_in_care counters against the patients in care.")
+    parser.add_argument("--fix", action="store_true", help="Overwrite drifted counters with the live counts")
+    args = parser.parse_args()
+
+    db = initialize_firestore()
+    audit_capacity(db, fix=args.fix)
+
+
+if __name__ == "__main__":
+    main()
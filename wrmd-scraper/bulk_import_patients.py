@@ -0,0 +1,108 @@
+# Backfill tool: imports every pending patient of a year in one pass.
+# Usage: python bulk_import_patients.py --year 2025 [--start-page N] [--show-browser]
+
+import argparse
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+from wrmd_scraper_core import launch_wrmd_driver, login_to_wrmd, iter_pending_patients
+from firebase_setup import initialize_firestore
+from audit_capacity import audit_capacity
+from local_cache import LocalCache
+from patient_record import classify_patient
+from timestamps import pacific_now, format_timestamp
+
+PROGRESS_EVERY = 25
+
+
+def bulk_import(db, cache, patients):
+    """
+    Consumes an iterable of ScrapedRow (normally iter_pending_patients) and writes them
+    through a Firestore BulkWriter. A row is recorded in the local cache only once Firestore
+    has confirmed its write, and rows already in the cache are skipped, so re-running with
+    --start-page after any interruption (a kill included) re-imports whatever was not confirmed.
+    Capacity counters are not incremented per row: once the writer is flushed they are recomputed
+    from the patients actually in care (audit_capacity with fix=True), which also repairs the
+    counters of an earlier run that was cut short.
+    Returns a Counter of confirmed rows per collection.
+    """
+    last_checked = format_timestamp(pacific_now())
+    bulk_writer = db.bulk_writer()
+    bulk_writer.on_write_error(lambda failure, _writer: failure.attempts < 5)
+    # Results arrive on the writer's threads; the cache connection belongs to this one
+    confirmed = deque()
+    bulk_writer.on_write_result(lambda reference, result, writer: confirmed.append(reference.id))
+
+    pending = {}
+    imported = Counter()
+    last_page = None
+    started = time.monotonic()
+
+    def record_confirmed():
+        while confirmed:
+            pid = confirmed.popleft()
+            collection, data = pending.pop(pid)
+            cache.put(collection, pid, data)
+            imported[collection] += 1
+
+    try:
+        for row in patients:
+            pid = row.case_number
+            last_page = row.page_number
+            record_confirmed()
+            if pid in pending or cache.find(pid)[0] is not None:
+                print(f"⏭️ Already imported: {pid}")
+                continue
+
+            record = classify_patient(row, last_checked)
+            data = dict(record.to_firestore(), updated_at=datetime.now(timezone.utc))
+            pending[pid] = (record.collection, data)
+            bulk_writer.set(db.collection(record.collection).document(pid), data)
+
+            queued = sum(imported.values()) + len(pending)
+            if queued % PROGRESS_EVERY == 0:
+                rate = queued / (time.monotonic() - started)
+                print(f"📦 {queued} rows queued through page {last_page} ({rate:.1f} rows/s)")
+
+    finally:
+        # Flush pending writes before recording them and touching the counters
+        bulk_writer.close()
+        record_confirmed()
+        for pid, (collection, _) in pending.items():
+            print(f"❌ Write not confirmed, will be retried on the next run: {collection}/{pid}")
+
+        audit_capacity(db, fix=True)
+
+        total = sum(imported.values())
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed > 0 else 0.0
+        print(f"✅ Imported {total} rows in {elapsed:.1f}s ({rate:.1f} rows/s): {dict(imported)}")
+        if last_page is not None:
+            print(f"   Last page reached: {last_page} (resume with --start-page {last_page})")
+
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import pending WRMD patients into Firestore.")
+    parser.add_argument("--year", default=str(datetime.now().year), help="WRMD year to import, e.g. 2025")
+    parser.add_argument("--start-page", type=int, default=1, help="Resume from this list page")
+    parser.add_argument("--show-browser", action="store_true", help="Run Chrome with a visible window")
+    args = parser.parse_args()
+
+    db = initialize_firestore()
+    cache = LocalCache()
+    cache.reconcile(db)
+
+    driver, wait = launch_wrmd_driver(headless=not args.show_browser)
+    try:
+        login_to_wrmd(driver, wait)
+        bulk_import(db, cache, iter_pending_patients(driver, wait, args.year, start_page=args.start_page))
+    finally:
+        driver.quit()
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+from datetime import datetime, timezone
+
+CHANGEFEED_COLLECTION = "changefeed"
+# Number of runs kept; a client older than that has to reload everything
+CHANGEFEED_RETENTION = 200
+# Runs touching more patients than this publish a reload marker instead of the entries,
+# which keeps every feed document well under the 1 MiB document limit
+MAX_FEED_ENTRIES = 1500
+
+
+def feed_doc_id(seq):
+    # Zero padded so document IDs sort like the sequence numbers
+    return f"{seq:010d}"
+
+
+def build_feed_entry(changes, seq, run_id):
+    """
+    Returns the changefeed document for one run.
+    added/moved/updated/removed map case numbers to the values a client needs to patch its copy:
+    added, moved and updated carry the new document fields and target collection (moved also has
+    "from"), removed carries the collection the document was deleted from.
+    """
+    entry = {
+        "seq": seq,
+        "run_id": run_id,
+        "published_at": datetime.now(timezone.utc),
+        "counts": changes.summary(),
+    }
+    if changes.full_reload or sum(entry["counts"].values()) > MAX_FEED_ENTRIES:
+        entry["full_reload"] = True
+        return entry
+
+    entry["full_reload"] = False
+    entry["added"] = changes.added
+    entry["moved"] = changes.moved
+    entry["updated"] = changes.updated
+    entry["removed"] = {
+        pid: {"collection": removed["collection"], "disposition": removed["disposition"]}
+        for pid, removed in changes.removed.items()
+    }
+    return entry
+
+
+def publish_changes(db, changes, run_start):
+    """
+    Publishes the run's changes as changefeed/{seq} and advances system/changefeed
+    (latest_seq, oldest_seq) in one transaction, then prunes documents older than the
+    retention window. Runs that changed nothing publish nothing.
+    Clients holding a sequence below oldest_seq - 1 must do a full reload.
+    Returns the new sequence number, or None.
+    """
+    if not changes:
+        print("📰 No changes to publish")
+        return None
+
+    from firebase_admin import firestore
+    from google.cloud.firestore_v1.base_query import FieldFilter
+
+    run_id = run_start.isoformat(timespec="seconds")
+    pointer_ref = db.collection("system").document("changefeed")
+
+    @firestore.transactional
+    def transaction_op(transaction):
+        snapshot = pointer_ref.get(transaction=transaction)
+        seq = (snapshot.get("latest_seq") if snapshot.exists else 0) + 1
+        oldest_seq = max(1, seq - CHANGEFEED_RETENTION + 1)
+        transaction.set(db.collection(CHANGEFEED_COLLECTION).document(feed_doc_id(seq)),
+                        build_feed_entry(changes, seq, run_id))
+        transaction.set(pointer_ref, {
+            "latest_seq": seq,
+            "oldest_seq": oldest_seq,
+            "updated_at": datetime.now(timezone.utc),
+        })
+        return seq, oldest_seq
+
+    seq, oldest_seq = transaction_op(db.transaction())
+
+    expired = db.collection(CHANGEFEED_COLLECTION).where(filter=FieldFilter("seq", "<", oldest_seq))
+    pruned = 0
+    for doc in expired.stream():
+        doc.reference.delete()
+        pruned += 1
+
+    print(f"📰 Published change feed #{seq}: {changes.summary()}" + (f" (pruned {pruned})" if pruned else ""))
+    return seq
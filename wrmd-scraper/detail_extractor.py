@@ -0,0 +1,105 @@
+import re
+from html import unescape
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from navigation import DETAIL_READY
+from patient_record import ScrapedRow
+
+AGE_FIELD = "exams[age_unit]"
+
+# One round trip for the whole list page: cell texts plus the species link of every row
+ROWS_SCRIPT = """
+return Array.from(document.querySelectorAll('table.table tbody tr')).map(function (tr) {
+    var cells = Array.from(tr.querySelectorAll('td'));
+    var link = cells.length > 2 ? cells[2].querySelector('a') : null;
+    return {cells: cells.map(function (td) { return td.innerText.trim(); }), href: link ? link.href : null};
+});
+"""
+
+# Selected option of the age select, null when the field is not in the DOM
+AGE_SCRIPT = """
+var select = document.querySelector('select[name="exams[age_unit]"]');
+if (!select) { return null; }
+var option = select.selectedOptions.length ? select.selectedOptions[0] : select.querySelector('option[selected]');
+return option ? option.textContent.trim() : '';
+"""
+
+AGE_SELECT_PATTERN = re.compile(r'<select[^>]*name="exams\[age_unit\]"[^>]*>(.*?)</select>', re.S | re.I)
+OPTION_PATTERN = re.compile(r'<option([^>]*)>(.*?)</option>', re.S | re.I)
+
+
+def snapshot_rows(driver, page_number, min_cells=8):
+    """
+    Reads every row of the current list page in one script call.
+    Returns [(ScrapedRow, detail href or None)] for rows with at least min_cells cells, so the
+    caller can navigate away from the list without holding on to (soon stale) elements.
+    """
+    snapshot = []
+    for entry in driver.execute_script(ROWS_SCRIPT) or []:
+        if len(entry["cells"]) < min_cells:
+            continue
+        snapshot.append((ScrapedRow.from_texts(entry["cells"], page_number), entry["href"]))
+    return snapshot
+
+
+def age_from_source(page_source):
+    """
+    Selected age option parsed from the page HTML; None when the field is absent.
+    """
+    match = AGE_SELECT_PATTERN.search(page_source)
+    if match is None:
+        return None
+    options = OPTION_PATTERN.findall(match.group(1))
+    for attributes, text in options:
+        if re.search(r'\bselected\b', attributes):
+            return unescape(re.sub(r'<[^>]+>', '', text)).strip()
+    # A select without a selected option shows its first one
+    return unescape(re.sub(r'<[^>]+>', '', options[0][1])).strip() if options else ""
+
+
+def read_age_from_page(driver):
+    try:
+        age = driver.execute_script(AGE_SCRIPT)
+    except Exception as e:
+        print(f"⚠️ Age script failed, parsing page source: {str(e)[:120]}")
+        age = age_from_source(driver.page_source)
+    return age
+
+
+def read_age_by_clicking(nav):
+    """
+    Fallback for detail pages that only render the age field once the Initial Care tab is opened.
+    """
+    driver = nav.driver
+    try:
+        initial_care_link = driver.find_element(*DETAIL_READY)
+        driver.execute_script("arguments[0].scrollIntoView(true);", initial_care_link)
+        driver.execute_script("arguments[0].click();", initial_care_link)
+    except Exception as e:
+        print(f"⚠️ Failed to click 'Initial Care': {e}")
+
+    try:
+        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.NAME, AGE_FIELD)))
+        return read_age_from_page(driver)
+    except Exception as e:
+        print(f"⚠️ Failed to extract age stage: {e}")
+        return None
+
+
+def read_age_stage(nav, href):
+    """
+    Loads a patient's detail page (href of the species link) in the current tab and returns
+    the raw age stage text, or None if it could not be read.
+    The selected option is read straight from the DOM (or page source); the Initial Care tab
+    is only clicked when the field is not on the page yet.
+    Raises NavigationError if the detail page could not be loaded.
+    """
+    if not href:
+        raise ValueError("row has no patient link")
+    nav.load(href, locator=DETAIL_READY, page_kind="detail")
+
+    age_stage_raw = read_age_from_page(nav.driver)
+    if age_stage_raw is None:
+        age_stage_raw = read_age_by_clicking(nav)
+    return age_stage_raw
@@ -0,0 +1,198 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from selenium.common.exceptions import InvalidSessionIdException, NoSuchWindowException
+from wrmd_scraper_core import launch_wrmd_driver, login_to_wrmd
+from navigation import Navigator
+
+MAX_PAGES_PER_BROWSER = int(os.environ.get("WRMD_MAX_PAGES_PER_BROWSER", "150"))
+MAX_RENDERER_RSS_MB = int(os.environ.get("WRMD_MAX_RENDERER_RSS_MB", "1024"))
+
+
+def _child_pids():
+    """
+    Returns {ppid: [pid, ...]} for every process visible in /proc (Linux only).
+    """
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces, so split after the closing paren
+                fields = f.read().rsplit(")", 1)[1].split()
+            children.setdefault(int(fields[1]), []).append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return children
+
+
+def _rss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _is_renderer(pid):
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return b"--type=renderer" in f.read()
+    except OSError:
+        return False
+
+
+class DriverManager:
+    """
+    Owns the Chrome instance for a run.
+    Before every page load it closes leaked tabs, samples the renderer RSS and the
+    number of open windows, and transparently relaunches and logs in again after
+    max_pages loads or once the renderers pass max_renderer_rss_mb.
+    The Navigator it hands out always points at the current browser.
+    start_in_background() launches and logs in on a worker thread so the caller can
+    set up Firestore meanwhile; first_page_at records when the first page finished loading.
+    """
+
+    def __init__(self, headless=True, max_pages=MAX_PAGES_PER_BROWSER, max_renderer_rss_mb=MAX_RENDERER_RSS_MB):
+        self.headless = headless
+        self.max_pages = max_pages
+        self.max_renderer_rss_mb = max_renderer_rss_mb
+        self.driver = None
+        self.wait = None
+        self.main_window = None
+        self.nav = None
+
+        self.pages_loaded = 0
+        self.pages_since_restart = 0
+        self.restarts = 0
+        self.leaked_tabs_closed = 0
+        self.peak_renderer_rss_mb = 0.0
+        self.peak_window_handles = 0
+        self.first_page_at = None
+        self._starting = None
+
+    def start_in_background(self):
+        """
+        Runs start() on a worker thread and returns its Future (resolving to the Navigator).
+        """
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chrome-start")
+        self._starting = executor.submit(self.start)
+        executor.shutdown(wait=False)
+        return self._starting
+
+    def start(self):
+        self.driver, self.wait = launch_wrmd_driver(headless=self.headless)
+        login_to_wrmd(self.driver, self.wait)
+        self.main_window = self.driver.current_window_handle
+        self.pages_since_restart = 0
+
+        if self.nav is None:
+            self.nav = Navigator(self.driver, self.wait, relogin=self.relogin, before_load=self.before_load,
+                                 after_load=self.after_load, restart=self.restart)
+        else:
+            self.nav.driver, self.nav.wait = self.driver, self.wait
+            self.nav.last_url = None
+        return self.nav
+
+    def relogin(self):
+        login_to_wrmd(self.driver, self.wait)
+
+    def quit(self):
+        # A launch still in progress would otherwise leave Chrome running
+        starting, self._starting = self._starting, None
+        if starting is not None:
+            try:
+                starting.result()
+            except Exception:
+                pass
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception as e:
+                print(f"⚠️ Failed to quit Chrome cleanly: {e}")
+            self.driver = None
+
+    def restart(self, reason="requested"):
+        print(f"♻️ Restarting Chrome ({reason}) after {self.pages_since_restart} pages")
+        self.quit()
+        self.restarts += 1
+        self.start()
+
+    def renderer_rss_mb(self):
+        """
+        Sums the resident memory of Chrome renderer processes started by this driver.
+        Returns None when it cannot be measured (no /proc or no service process).
+        """
+        try:
+            root = self.driver.service.process.pid
+        except AttributeError:
+            return None
+        if not os.path.isdir("/proc"):
+            return None
+
+        children = _child_pids()
+        total_kb, stack = 0, [root]
+        while stack:
+            pid = stack.pop()
+            for child in children.get(pid, []):
+                if _is_renderer(child):
+                    total_kb += _rss_kb(child)
+                stack.append(child)
+        return total_kb / 1024
+
+    def close_leaked_tabs(self):
+        """
+        Closes every window except the main one and switches back to it.
+        """
+        handles = self.driver.window_handles
+        self.peak_window_handles = max(self.peak_window_handles, len(handles))
+        if self.main_window not in handles:
+            self.main_window = handles[0]
+        for handle in handles:
+            if handle != self.main_window:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+                self.leaked_tabs_closed += 1
+        if len(handles) > 1:
+            print(f"🧹 Closed {len(handles) - 1} leaked tab(s)")
+        self.driver.switch_to.window(self.main_window)
+
+    def before_load(self):
+        """
+        Called by the Navigator before each page load, when no element from the
+        previous page is still in use.
+        """
+        self.pages_loaded += 1
+        self.pages_since_restart += 1
+        try:
+            self.close_leaked_tabs()
+        except (InvalidSessionIdException, NoSuchWindowException, IndexError):
+            self.restart("browser session lost")
+            return
+
+        rss = self.renderer_rss_mb()
+        if rss is not None:
+            self.peak_renderer_rss_mb = max(self.peak_renderer_rss_mb, rss)
+
+        if self.pages_since_restart > self.max_pages:
+            self.restart(f"page limit {self.max_pages}")
+        elif rss is not None and rss > self.max_renderer_rss_mb:
+            self.restart(f"renderer RSS {rss:.0f} MB > {self.max_renderer_rss_mb} MB")
+
+    def after_load(self):
+        if self.first_page_at is None:
+            self.first_page_at = time.perf_counter()
+
+    def summary(self):
+        return {
+            "pages_loaded": self.pages_loaded,
+            "restarts": self.restarts,
+            "leaked_tabs_closed": self.leaked_tabs_closed,
+            "peak_renderer_rss_mb": round(self.peak_renderer_rss_mb, 1),
+            "peak_window_handles": self.peak_window_handles,
+            "rate_controller": self.nav.controller.summary() if self.nav is not None else None,
+        }
@@ -1,8 +1,10 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
+# firebase_admin is imported inside the functions that need it: it is the slowest import of the
+# scraper, and the species/age matching helpers here are used without Firestore.
 import re
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 import uuid
+from timestamps import pacific_now, format_timestamp
+from run_journal import APPLIED_OPS_COLLECTION
 
 def slugify(text):
     text = text.lower()
@@ -14,6 +16,9 @@ def initialize_firestore():
     Initializes Firebase app and returns Firestore client.
     Requires serviceAccountKey.json to be in the root directory.
     """
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
     try:
         # Only initialize app if not already initialized
         if not firebase_admin._apps:
@@ -86,22 +91,105 @@ def match_age_stage(age_stage_scraped):
     else:
         return None
 
-def update_capacity_count(db, species, age_stage, delta):
+def update_capacity_count(db, species, age_stage, delta, op_id=None):
+    """
+    Applies delta to species/{slug}/age/{stage}.number_in_care (clamped at zero)
+    and returns the new count.
+    With an op_id (see RunJournal.op_id) the delta is applied at most once: the
+    applied_ops/{op_id} marker is written in the same transaction, and a delta whose
+    marker already exists is skipped.
+    """
+    from firebase_admin import firestore
+
     species_slug = slugify(species)
     age_stage = age_stage.lower()
 
     ref = db.collection("species").document(species_slug).collection("age").document(age_stage)
+    marker_ref = db.collection(APPLIED_OPS_COLLECTION).document(op_id) if op_id else None
 
     @firestore.transactional
     def transaction_op(transaction):
         snapshot = ref.get(transaction=transaction)
         current = snapshot.get("number_in_care") or 0
-        transaction.update(ref, {"number_in_care": max(0, current + delta)})
+        if marker_ref is not None and marker_ref.get(transaction=transaction).exists:
+            print(f"📓 Capacity change {op_id} was already applied")
+            return current
+        new_count = max(0, current + delta)
+        transaction.update(ref, {"number_in_care": new_count})
+        if marker_ref is not None:
+            transaction.set(marker_ref, {
+                "run_id": op_id.partition("|")[0],
+                "delta": delta,
+                "applied_at": datetime.now(timezone.utc),
+            })
+        return new_count
 
     transaction = db.transaction()
-    transaction_op(transaction)
+    return transaction_op(transaction)
+
+def set_patient(db, cache, collection, patient_id, data):
+    """
+    Writes a patient document to Firestore and mirrors it into the local cache.
+    updated_at is stamped on every write so the cache can reconcile incrementally.
+    """
+    data = dict(data, updated_at=datetime.now(timezone.utc))
+    db.collection(collection).document(patient_id).set(data)
+    if cache is not None:
+        cache.put(collection, patient_id, data)
+
+def write_record(db, cache, record):
+    """
+    Writes a PatientRecord unless the cached copy already has the same content.
+    Returns True if a write was made.
+    """
+    if cache is not None:
+        existing = cache.get(record.collection, record.patient_id)
+        if existing is not None and record.matches(existing):
+            return False
+    set_patient(db, cache, record.collection, record.patient_id, record.to_firestore())
+    return True
+
+def add_new_patient(db, cache, record, journal=None, changes=None):
+    """
+    Writes a newly found patient, takes a capacity slot if it is in care and logs the add.
+    With a RunJournal the add is keyed "add:<patient_id>": an add already completed in this
+    run is skipped and an interrupted one never takes its capacity slot twice.
+    The add is recorded in changes (a RunChanges) before the operation is marked done.
+    Returns False if the add was skipped.
+    """
+    key = f"add:{record.patient_id}"
+    if journal is not None:
+        if journal.is_op_done(key):
+            print(f"📓 Already added in this run: {record.patient_id}")
+            return False
+        journal.op_begin(key, {"collection": record.collection, "data": record.to_firestore()})
+
+    write_record(db, cache, record)
+    if record.collection == "patients_in_care" and (journal is None or not journal.has_step(key, "capacity")):
+        update_capacity_count(db, record.species, record.age_stage, delta=1,
+                              op_id=journal.op_id(key) if journal is not None else None)
+        if journal is not None:
+            journal.op_step(key, "capacity")
+    log_message(db, record.page_number, record.patient_id, record.species, record.display_age,
+                action="add", success=record.collection != "failed_patients")
+
+    if changes is not None:
+        changes.record_add(record)
+    if journal is not None:
+        journal.op_done(key)
+    return True
+
+def delete_patient(db, cache, collection, patient_id):
+    """
+    Deletes a patient document from Firestore and from the local cache.
+    """
+    db.collection(collection).document(patient_id).delete()
+    if cache is not None:
+        cache.delete(collection, patient_id)
 
 def log_message(db, page_number, patient_id, species, age_stage, action, success):
+    from firebase_admin import firestore
+
     message_ref = db.collection("message")
 
     # Check total count and enforce 100-document limit
@@ -118,5 +206,5 @@ def log_message(db, page_number, patient_id, species, age_stage, action, success
         "age_stage": age_stage,
         "action": action,
         "success": success,
-        "timestamp": datetime.now(timezone.utc).astimezone(timezone(timedelta(hours=-7))).strftime("%B %d, %Y at %I:%M:%S %p UTC-7")
+        "timestamp": format_timestamp(pacific_now())
     })
\ No newline at end of file
@@ -0,0 +1,294 @@
+# Scaling test for the Firestore side of the sync.
+# Fills a store with synthetic species/patients/messages and replays WRMD observations
+# through the real sync functions, reporting time and Firestore operations per phase.
+# Usage: python load_test.py [--target memory|emulator] [--patients 1000,5000,20000] [--years 3]
+# The emulator target needs FIRESTORE_EMULATOR_HOST (e.g. firebase emulators:start --only firestore).
+
+import argparse
+import contextlib
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+
+from firebase_setup import slugify, add_new_patient
+from local_cache import LocalCache, PATIENT_COLLECTIONS
+from memory_firestore import MemoryFirestore
+from patient_record import ScrapedRow, PatientRecord, classify_patient
+from rollups import write_daily_rollup
+from changefeed import publish_changes
+from audit_capacity import audit_capacity
+from run_changes import RunChanges
+from timestamps import pacific_now, format_timestamp
+from update_patients import get_wid_in_care, remove_discharged_patient, recheck_failed_patient
+from year_schedule import YEARS_MIGRATED_DOC, active_prefixes
+
+SPECIES = {
+    "Amphibian": ["Amphibian"],
+    "Coyote": ["Coyote"],
+    "Deer": ["Black-tailed Deer"],
+    "Beaver": ["American Beaver"],
+    "Bat": ["Big Brown Bat", "Little Brown Bat"],
+    "Rat Mouse": ["Deer Mouse", "Norway Rat"],
+    "Squirrel": ["Eastern Gray Squirrel", "Douglas Squirrel"],
+    "Chipmunk": ["Townsend's Chipmunk"],
+    "Eastern Cottontail": ["Eastern Cottontail"],
+    "Weasel": ["Long-tailed Weasel"],
+    "Marten": ["Pacific Marten"],
+    "Reptile": ["Reptile"],
+    "Fox": ["Red Fox"],
+    "Badger": ["American Badger"],
+    "Fisher": ["Fisher"],
+    "Skunk": ["Striped Skunk"],
+    "Raccoon": ["Raccoon"],
+    "Porcupine": ["North American Porcupine"],
+    "Muskrat MtBeavor Marmot": ["Muskrat", "Hoary Marmot"],
+    "River Otter": ["North American River Otter"],
+    "Opossum": ["Virginia Opossum"],
+    "Pigeon": ["Rock Pigeon"],
+}
+UNTRACKED_SPECIES = ["American Robin", "Mallard", "Bald Eagle", "Barred Owl", "Anna's Hummingbird"]
+RAW_AGES = {"Infant": ["Neonate", "Infant"], "Juvenile": ["Juvenile"], "Adult": ["Adult", "Sub-adult"]}
+INVALID_AGES = ["", "Unknown", "Hatchling", "Nestling"]
+ROWS_PER_PAGE = 25
+BATCH_SIZE = 500
+
+# Share of the population touched by one replayed run
+DISCHARGE_FRACTION = 0.05
+ADMIT_FRACTION = 0.02
+RECHECK_FRACTION = 0.5
+
+
+def open_store(target, label):
+    if target == "memory":
+        return MemoryFirestore()
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        raise SystemExit("FIRESTORE_EMULATOR_HOST is not set; start the Firestore emulator first")
+    from google.cloud import firestore
+    # A fresh project per scale keeps runs from seeing each other's data
+    return firestore.Client(project=f"demo-load-{label}-{uuid.uuid4().hex[:8]}")
+
+
+class BatchWriter:
+    """
+    Groups generator writes into batches of BATCH_SIZE.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.batch = db.batch()
+        self.pending = 0
+
+    def set(self, ref, data):
+        self.batch.set(ref, data)
+        self.pending += 1
+        if self.pending >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.batch.commit()
+            self.batch = self.db.batch()
+            self.pending = 0
+
+
+def synthetic_row(rng, case_number, page_number, year, pending=True, tracked=True, valid_age=True):
+    """
+    Returns a ScrapedRow as the list and detail pages would show it.
+    """
+    species = rng.choice(SPECIES[rng.choice(list(SPECIES))]) if tracked else rng.choice(UNTRACKED_SPECIES)
+    if valid_age:
+        age_stage = rng.choice(RAW_AGES[rng.choice(list(RAW_AGES))])
+    else:
+        age_stage = rng.choice(INVALID_AGES)
+    admitted = date(year, 1, 1) + timedelta(days=rng.randrange(365))
+    return ScrapedRow(
+        case_number=case_number,
+        species=species,
+        disposition="pending" if pending else "released",
+        date_admitted=admitted,
+        page_number=page_number,
+        age_stage=age_stage,
+    )
+
+
+def generate(db, patients, years, rng):
+    """
+    Seeds species/{slug} and species/{slug}/age/{stage}, then `patients` pending patients spread
+    over the last `years` WRMD years (70% tracked, 20% untracked species, 10% invalid age),
+    and a full 100-document message log. Capacity counters match the generated patients, and
+    every patient document carries its year, so the year migration is marked as done.
+    Returns the list of generated ScrapedRow.
+    """
+    writer = BatchWriter(db)
+    last_checked = format_timestamp(pacific_now())
+    this_year = pacific_now().year
+
+    rows = []
+    per_year = -(-patients // years)
+    for offset in range(years):
+        year = this_year - offset
+        for index in range(min(per_year, patients - len(rows))):
+            roll = rng.random()
+            rows.append(synthetic_row(
+                rng, f"{year % 100:02d}-{index + 1}", index // ROWS_PER_PAGE + 1, year,
+                tracked=roll < 0.8, valid_age=roll < 0.7 or roll >= 0.8,
+            ))
+
+    in_care = {}
+    for row in rows:
+        record = classify_patient(row, last_checked)
+        writer.set(db.collection(record.collection).document(record.patient_id), record.to_firestore())
+        if record.collection == "patients_in_care":
+            key = (record.species, record.age_stage)
+            in_care[key] = in_care.get(key, 0) + 1
+
+    for name in SPECIES:
+        species_ref = db.collection("species").document(slugify(name))
+        writer.set(species_ref, {"name": name, "shared_capacity": 0})
+        for stage in RAW_AGES:
+            writer.set(species_ref.collection("age").document(stage.lower()), {
+                "age": stage,
+                "capacity": 50,
+                "number_in_care": in_care.get((name, stage), 0),
+            })
+
+    for i in range(100):
+        writer.set(db.collection("message").document(str(uuid.uuid4())), {
+            "patient_id": rows[i % len(rows)].case_number if rows else "",
+            "page_number": 1,
+            "species": "Raccoon",
+            "age_stage": "Adult",
+            "action": "add",
+            "success": True,
+            # Fixed-width sortable stamps so the oldest message is well defined
+            "timestamp": f"2000-01-01 00:{i // 60:02d}:{i % 60:02d}",
+        })
+
+    writer.set(db.collection(YEARS_MIGRATED_DOC[0]).document(YEARS_MIGRATED_DOC[1]), {"migrated": True})
+    writer.flush()
+    return rows
+
+
+def legacy_scan(db):
+    """
+    What get_wid_in_care and the page lookups did before the local cache:
+    stream all three patient collections, then read each document again by ID.
+    """
+    ids = []
+    for collection_name in PATIENT_COLLECTIONS:
+        for doc in db.collection(collection_name).stream():
+            ids.append((collection_name, doc.id))
+    for collection_name, wid in ids:
+        db.collection(collection_name).document(wid).get()
+    return len(ids)
+
+
+def replay(db, cache, rows, rng):
+    """
+    Replays one synthetic sync run through the real update functions and yields
+    (phase name, callable) pairs so the caller can time each phase.
+    """
+    changes = RunChanges()
+    last_checked = format_timestamp(pacific_now())
+    by_id = {row.case_number: row for row in rows}
+
+    def discharges():
+        in_care = cache.ids("patients_in_care")
+        for wid in rng.sample(in_care, int(len(in_care) * DISCHARGE_FRACTION)):
+            row = ScrapedRow(wid, by_id[wid].species, "released", by_id[wid].date_admitted, by_id[wid].page_number)
+            remove_discharged_patient(db, cache, changes, row, cache.get("patients_in_care", wid))
+
+    def failed_rechecks():
+        failed = cache.ids("failed_patients")
+        for wid in rng.sample(failed, int(len(failed) * RECHECK_FRACTION)):
+            record = PatientRecord.from_firestore("failed_patients", cache.get("failed_patients", wid))
+            recheck_failed_patient(db, cache, changes, record, "Juvenile", record.page_number, last_checked)
+
+    def admissions():
+        this_year = pacific_now().year
+        start = sum(1 for row in rows if row.case_number.startswith(f"{this_year % 100:02d}-"))
+        for index in range(start, start + max(1, int(len(rows) * ADMIT_FRACTION))):
+            row = synthetic_row(rng, f"{this_year % 100:02d}-{index + 1}", index // ROWS_PER_PAGE + 1, this_year)
+            record = classify_patient(row, last_checked)
+            add_new_patient(db, cache, record, changes=changes)
+
+    yield "reconcile (cold cache)", lambda: cache.reconcile(db)
+    yield "reconcile (warm cache)", lambda: cache.reconcile(db)
+    yield "reconcile (active years)", lambda: cache.reconcile(db, active_prefixes(pacific_now().year))
+    yield "legacy full scan", lambda: legacy_scan(db)
+    yield "get_wid_in_care", lambda: get_wid_in_care(cache)
+    yield "discharges", discharges
+    yield "failed rechecks", failed_rechecks
+    yield "admissions", admissions
+    yield "daily rollup", lambda: write_daily_rollup(db, changes, cache.occupancy(), pacific_now())
+    yield "change feed", lambda: publish_changes(db, changes, pacific_now())
+    yield "capacity audit", lambda: audit_capacity(db)
+
+
+def run_scale(target, patients, years, seed, verbose):
+    """
+    Generates and replays one scale. Returns [(phase, seconds, ops or None)].
+    """
+    rng = random.Random(seed)
+    db = open_store(target, patients)
+    ops = getattr(db, "ops", None)
+
+    started = time.perf_counter()
+    rows = generate(db, patients, years, rng)
+    print(f"🧪 {patients} patients over {years} years generated in {time.perf_counter() - started:.1f}s")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        cache = LocalCache(os.path.join(tmp, "load_test.sqlite3"))
+        try:
+            for phase, action in replay(db, cache, rows, rng):
+                before = ops.snapshot() if ops is not None else None
+                started = time.perf_counter()
+                # The sync functions log every patient; keep the report readable
+                with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(devnull):
+                    action()
+                elapsed = time.perf_counter() - started
+                results.append((phase, elapsed, ops.since(before) if ops is not None else None))
+        finally:
+            cache.close()
+    return results
+
+
+def format_ops(counts):
+    if counts is None:
+        return "n/a"
+    return ", ".join(f"{name}={counts[name]}" for name in sorted(counts)) or "none"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay synthetic WRMD observations against Firestore at scale.")
+    parser.add_argument("--target", choices=("memory", "emulator"), default="memory")
+    parser.add_argument("--patients", default="1000,5000,20000", help="Comma-separated patient counts")
+    parser.add_argument("--years", type=int, default=3, help="Number of WRMD years to spread patients over")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--verbose", action="store_true", help="Show the sync functions' own output")
+    args = parser.parse_args()
+
+    scales = [int(n) for n in args.patients.split(",") if n.strip()]
+    report = {}
+    for patients in scales:
+        report[patients] = run_scale(args.target, patients, args.years, args.seed, args.verbose)
+        for phase, elapsed, counts in report[patients]:
+            print(f"   {phase:<24} {elapsed * 1000:9.1f} ms   {format_ops(counts)}")
+
+    print(f"\n📊 Scaling summary ({args.target}): ms and document reads per 1000 patients")
+    print(f"   {'phase':<24}" + "".join(f"{n:>20}" for n in scales))
+    for index, (phase, _, _) in enumerate(report[scales[0]]):
+        cells = []
+        for patients in scales:
+            _, elapsed, counts = report[patients][index]
+            reads = "" if counts is None else f"/{counts.get('reads', 0) * 1000 / patients:.0f}r"
+            cells.append(f"{elapsed * 1000 * 1000 / patients:.1f}ms{reads}")
+        print(f"   {phase:<24}" + "".join(f"{cell:>20}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
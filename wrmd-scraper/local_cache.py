@@ -0,0 +1,233 @@
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+from year_schedule import prefix_year, years_migrated
+
+PATIENT_COLLECTIONS = ("patients_in_care", "other_patients", "failed_patients")
+# Firestore's limit on the values of one "in" filter
+IN_FILTER_LIMIT = 30
+
+CACHE_PATH = os.environ.get(
+    "WRMD_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "wrmd_cache.sqlite3")
+)
+
+
+def _json_default(value):
+    # Firestore returns DatetimeWithNanoseconds for timestamp fields
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class LocalCache:
+    """
+    Embedded SQLite mirror of patients_in_care, other_patients and failed_patients.
+
+    The sync writes through this cache (see firebase_setup.set_patient and friends),
+    so every lookup during a run can be served locally. At startup reconcile()
+    pulls only documents whose updated_at moved past the last seen watermark and
+    re-downloads whatever the local counts show to have drifted from Firestore.
+    The species counters are not mirrored: the dashboard edits them in its own
+    transactions, so they are always read from Firestore.
+    """
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS patients (
+                collection TEXT NOT NULL,
+                wid TEXT NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (collection, wid)
+            );
+            -- Counter mirror of older cache files
+            DROP TABLE IF EXISTS capacity;
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    # -------- patients --------
+
+    def get(self, collection, wid):
+        row = self.conn.execute(
+            "SELECT data FROM patients WHERE collection = ? AND wid = ?", (collection, wid)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find(self, wid, collections=PATIENT_COLLECTIONS):
+        """
+        Returns (collection, data) for the first collection holding wid, or (None, None).
+        """
+        for collection in collections:
+            data = self.get(collection, wid)
+            if data is not None:
+                return collection, data
+        return None, None
+
+    def put(self, collection, wid, data, commit=True):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO patients (collection, wid, data) VALUES (?, ?, ?)",
+            (collection, wid, json.dumps(data, default=_json_default))
+        )
+        if commit:
+            self.conn.commit()
+
+    def update(self, collection, wid, fields):
+        data = self.get(collection, wid) or {}
+        data.update(fields)
+        self.put(collection, wid, data)
+
+    def delete(self, collection, wid):
+        self.conn.execute("DELETE FROM patients WHERE collection = ? AND wid = ?", (collection, wid))
+        self.conn.commit()
+
+    def ids(self, collection):
+        rows = self.conn.execute("SELECT wid FROM patients WHERE collection = ?", (collection,))
+        return [r[0] for r in rows]
+
+    def count(self, collection):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM patients WHERE collection = ?", (collection,)
+        ).fetchone()[0]
+
+    def occupancy(self):
+        """
+        Returns {(species, age_stage): count} for patients_in_care.
+        """
+        rows = self.conn.execute("""
+            SELECT json_extract(data, '$.species'), json_extract(data, '$.age_stage'), COUNT(*)
+            FROM patients WHERE collection = 'patients_in_care' GROUP BY 1, 2
+        """)
+        return {(species, age_stage): n for species, age_stage, n in rows}
+
+    def ids_by_year(self):
+        """
+        Same shape as update_patients.get_wid_in_care:
+        (wrmd_ids_by_year excluding failed patients, failed_patients_by_year)
+        """
+        wrmd_ids_by_year = {}
+        failed_patients_by_year = {}
+        rows = self.conn.execute("SELECT collection, wid FROM patients ORDER BY wid")
+        for collection, wid in rows:
+            year_prefix = wid.split("-")[0]
+            target = failed_patients_by_year if collection == "failed_patients" else wrmd_ids_by_year
+            target.setdefault(year_prefix, []).append(wid)
+        return wrmd_ids_by_year, failed_patients_by_year
+
+    def year_prefixes(self):
+        wrmd_ids_by_year, failed_patients_by_year = self.ids_by_year()
+        return set(wrmd_ids_by_year) | set(failed_patients_by_year)
+
+    def count_years(self, collection, year_prefixes):
+        return sum(1 for wid in self.ids(collection) if wid.split("-")[0] in year_prefixes)
+
+    # -------- reconciliation --------
+
+    def _get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def rebuild(self, db):
+        """
+        Drops the local mirror and re-downloads every patient document.
+        """
+        print("🗄️ Rebuilding local cache from Firestore...")
+        started = datetime.now(timezone.utc)
+        self.conn.execute("DELETE FROM patients")
+
+        for collection_name in PATIENT_COLLECTIONS:
+            for doc in db.collection(collection_name).stream():
+                self.put(collection_name, doc.id, doc.to_dict(), commit=False)
+
+        self._set_meta("watermark", started.isoformat())
+        self.conn.commit()
+
+    def _year_queries(self, db, collection_name, year_prefixes):
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        years = sorted(year for year in map(prefix_year, year_prefixes) if year is not None)
+        for start in range(0, len(years), IN_FILTER_LIMIT):
+            chunk = years[start:start + IN_FILTER_LIMIT]
+            yield db.collection(collection_name).where(filter=FieldFilter("year", "in", chunk))
+
+    def rebuild_years(self, db, collection_name, year_prefixes):
+        """
+        Replaces the local rows of these years in one collection, querying the indexed year field.
+        """
+        print(f"🗄️ Re-downloading {collection_name} for {', '.join('20' + y for y in sorted(year_prefixes))}...")
+        for wid in self.ids(collection_name):
+            if wid.split("-")[0] in year_prefixes:
+                self.conn.execute("DELETE FROM patients WHERE collection = ? AND wid = ?", (collection_name, wid))
+        for query in self._year_queries(db, collection_name, year_prefixes):
+            for doc in query.stream():
+                self.put(collection_name, doc.id, doc.to_dict(), commit=False)
+        self.conn.commit()
+
+    def reconcile(self, db, year_prefixes=None):
+        """
+        Brings the mirror up to date with Firestore.
+        Only documents whose updated_at is newer than the stored watermark are fetched,
+        which relies on every writer of patient documents stamping updated_at. Deletes are
+        not visible that way: if the per-collection counts disagree afterwards (a delete
+        balanced by an add still leaves the stamped add behind as an extra local row)
+        the drifted data is downloaded again.
+        With year_prefixes (the years the run walks) and the year field migrated, only those
+        years are counted and a drifted collection re-downloads just them; other years are
+        checked once a run walks them. Otherwise the whole cache is rebuilt, as it is when
+        there is no watermark yet (a cold rebuild also finds which dormant years still have patients).
+        Returns "rebuilt" or "incremental".
+        """
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        watermark = self._get_meta("watermark")
+        if watermark is None:
+            self.rebuild(db)
+            return "rebuilt"
+
+        since = datetime.fromisoformat(watermark)
+        started = datetime.now(timezone.utc)
+        changed = 0
+        for collection_name in PATIENT_COLLECTIONS:
+            query = db.collection(collection_name).where(filter=FieldFilter("updated_at", ">", since))
+            for doc in query.stream():
+                self.put(collection_name, doc.id, doc.to_dict(), commit=False)
+                changed += 1
+        self.conn.commit()
+
+        if year_prefixes is not None and years_migrated(db):
+            year_prefixes = set(year_prefixes)
+            for collection_name in PATIENT_COLLECTIONS:
+                remote = sum(query.count().get()[0][0].value
+                             for query in self._year_queries(db, collection_name, year_prefixes))
+                local = self.count_years(collection_name, year_prefixes)
+                if remote != local:
+                    print(f"⚠️ Cache drift in {collection_name}: local={local}, firestore={remote}")
+                    self.rebuild_years(db, collection_name, year_prefixes)
+        else:
+            for collection_name in PATIENT_COLLECTIONS:
+                remote = db.collection(collection_name).count().get()[0][0].value
+                local = self.count(collection_name)
+                if remote != local:
+                    print(f"⚠️ Cache drift in {collection_name}: local={local}, firestore={remote}")
+                    self.rebuild(db)
+                    return "rebuilt"
+
+        self._set_meta("watermark", started.isoformat())
+        self.conn.commit()
+        print(f"🗄️ Local cache reconciled ({changed} changed documents)")
+        return "incremental"
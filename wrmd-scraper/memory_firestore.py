@@ -0,0 +1,234 @@
+import copy
+import itertools
+from collections import Counter
+
+# In-memory stand-in for the parts of the Firestore client the sync uses, with
+# per-operation counters. Used by load_test.py; not a general Firestore emulator.
+
+
+class OpCounter(Counter):
+    """
+    Counts billable Firestore operations: document reads, writes and deletes,
+    plus queries, aggregations and transactions for context.
+    """
+
+    def snapshot(self):
+        return dict(self)
+
+    def since(self, earlier):
+        return {k: self[k] - earlier.get(k, 0) for k in self if self[k] - earlier.get(k, 0)}
+
+
+class MemorySnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class AggregateValue:
+    def __init__(self, value):
+        self.value = value
+
+
+class MemoryAggregation:
+    def __init__(self, query):
+        self.query = query
+
+    def get(self, **kwargs):
+        self.query.db.ops["aggregations"] += 1
+        # Firestore bills one read per 1000 index entries counted
+        matched = sum(1 for _ in self.query._matching())
+        self.query.db.ops["reads"] += max(1, -(-matched // 1000))
+        return [[AggregateValue(matched)]]
+
+
+class MemoryQuery:
+    OPS = {
+        "==": lambda a, b: a == b,
+        "!=": lambda a, b: a != b,
+        "<": lambda a, b: a is not None and a < b,
+        "<=": lambda a, b: a is not None and a <= b,
+        ">": lambda a, b: a is not None and a > b,
+        ">=": lambda a, b: a is not None and a >= b,
+        "in": lambda a, b: a in b,
+    }
+
+    def __init__(self, db, path, filters=(), order=None, limit_to=None, group=False):
+        self.db = db
+        self.path = path
+        self.filters = list(filters)
+        self.order = order
+        self.limit_to = limit_to
+        self.group = group
+
+    def _clone(self, **changes):
+        values = dict(filters=self.filters, order=self.order, limit_to=self.limit_to, group=self.group)
+        values.update(changes)
+        return MemoryQuery(self.db, self.path, **values)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._clone(filters=self.filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._clone(order=(field_path, direction))
+
+    def limit(self, count):
+        return self._clone(limit_to=count)
+
+    def count(self, alias=None):
+        return MemoryAggregation(self)
+
+    def _matching(self):
+        for path, data in self.db.docs.items():
+            parent, _, doc_id = path.rpartition("/")
+            if self.group:
+                if parent.rpartition("/")[2] != self.path:
+                    continue
+            elif parent != self.path:
+                continue
+            if all(self.OPS[op](data.get(field), value) for field, op, value in self.filters):
+                yield path, data
+
+    def stream(self, transaction=None):
+        self.db.ops["queries"] += 1
+        results = list(self._matching())
+        if self.order is not None:
+            field, direction = self.order
+            results.sort(key=lambda item: (item[1].get(field) is None, item[1].get(field)),
+                         reverse=str(direction).upper().endswith("DESCENDING"))
+        if self.limit_to is not None:
+            results = results[:self.limit_to]
+        self.db.ops["reads"] += max(1, len(results))
+        for path, data in results:
+            yield MemorySnapshot(MemoryDocument(self.db, path), copy.deepcopy(data))
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction=transaction))
+
+
+class MemoryCollection(MemoryQuery):
+    def __init__(self, db, path):
+        super().__init__(db, path)
+        self.id = path.rpartition("/")[2]
+
+    def document(self, doc_id):
+        return MemoryDocument(self.db, f"{self.path}/{doc_id}")
+
+    @property
+    def parent(self):
+        parent_path = self.path.rpartition("/")[0]
+        return MemoryDocument(self.db, parent_path) if parent_path else None
+
+
+class MemoryDocument:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+        self.id = path.rpartition("/")[2]
+
+    @property
+    def parent(self):
+        return MemoryCollection(self.db, self.path.rpartition("/")[0])
+
+    def collection(self, name):
+        return MemoryCollection(self.db, f"{self.path}/{name}")
+
+    def get(self, transaction=None):
+        self.db.ops["reads"] += 1
+        data = self.db.docs.get(self.path)
+        return MemorySnapshot(self, copy.deepcopy(data) if data is not None else None)
+
+    def set(self, data, merge=False):
+        self.db.ops["writes"] += 1
+        base = dict(self.db.docs.get(self.path, {})) if merge else {}
+        base.update(copy.deepcopy(data))
+        self.db.docs[self.path] = base
+
+    def update(self, fields):
+        if self.path not in self.db.docs:
+            raise KeyError(f"No document to update: {self.path}")
+        self.db.ops["writes"] += 1
+        self.db.docs[self.path].update(copy.deepcopy(fields))
+
+    def delete(self):
+        self.db.ops["deletes"] += 1
+        self.db.docs.pop(self.path, None)
+
+
+class MemoryTransaction:
+    """
+    Buffers writes until commit; implements the hooks firestore.transactional calls.
+    """
+    _ids = itertools.count(1)
+
+    def __init__(self, db):
+        self.db = db
+        self._id = None
+        self._read_only = False
+        self._max_attempts = 1
+        self._writes = []
+
+    def _clean_up(self):
+        self._writes = []
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._id = next(self._ids)
+        self.db.ops["transactions"] += 1
+
+    def _commit(self):
+        for op, ref, data in self._writes:
+            getattr(ref, op)(*data)
+        self._clean_up()
+
+    def _rollback(self):
+        self._clean_up()
+
+    def set(self, ref, data, merge=False):
+        self._writes.append(("set", ref, (data, merge)))
+
+    def update(self, ref, fields):
+        self._writes.append(("update", ref, (fields,)))
+
+    def delete(self, ref):
+        self._writes.append(("delete", ref, ()))
+
+
+class MemoryBatch(MemoryTransaction):
+    def commit(self):
+        self._commit()
+
+
+class MemoryFirestore:
+    """
+    Dict-backed Firestore stand-in: documents live in self.docs keyed by full path.
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.ops = OpCounter()
+
+    def collection(self, name):
+        return MemoryCollection(self, name)
+
+    def collection_group(self, name):
+        return MemoryQuery(self, name, group=True)
+
+    def transaction(self):
+        return MemoryTransaction(self)
+
+    def batch(self):
+        return MemoryBatch(self)
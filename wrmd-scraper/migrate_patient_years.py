@@ -0,0 +1,84 @@
+# One-off migration: stamps the indexed `year` field on patient documents written before it existed.
+# Usage: python migrate_patient_years.py [--dry-run]
+# Documents written by the sync already carry `year`; once every document has it, the migration
+# sets system/patient_years.migrated, after which LocalCache.reconcile checks and re-downloads
+# only the years a run walks instead of the whole history.
+
+import argparse
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+from firebase_setup import initialize_firestore
+from local_cache import PATIENT_COLLECTIONS
+from patient_record import patient_year
+from year_schedule import YEARS_MIGRATED_DOC as MIGRATION_DOC
+
+
+def migrate_patient_years(db, dry_run=False):
+    """
+    Adds year (from the YY- case number prefix) to every patient document that lacks it,
+    through a BulkWriter. updated_at is stamped like every other patient write, so the
+    local caches pick the new field up on their next reconcile.
+    The migrated marker is only written once Firestore confirmed every queued update;
+    otherwise the documents left without a confirmed year are listed and the migration
+    can simply be run again.
+    Returns a Counter of updated documents per collection.
+    """
+    updated = Counter()
+    unparsable = []
+    queued = set()
+    # Results arrive on the writer's threads
+    confirmed = deque()
+    bulk_writer = None if dry_run else db.bulk_writer()
+    if bulk_writer is not None:
+        bulk_writer.on_write_error(lambda failure, _writer: failure.attempts < 5)
+        bulk_writer.on_write_result(lambda reference, result, writer: confirmed.append(reference.path))
+
+    try:
+        for collection_name in PATIENT_COLLECTIONS:
+            for doc in db.collection(collection_name).stream():
+                year = patient_year(doc.id)
+                if year is None:
+                    unparsable.append(f"{collection_name}/{doc.id}")
+                    continue
+                if doc.to_dict().get("year") == year:
+                    continue
+                updated[collection_name] += 1
+                if bulk_writer is not None:
+                    queued.add(doc.reference.path)
+                    bulk_writer.update(doc.reference, {"year": year, "updated_at": datetime.now(timezone.utc)})
+    finally:
+        if bulk_writer is not None:
+            bulk_writer.close()
+
+    unconfirmed = sorted(queued - set(confirmed))
+    for path in unparsable:
+        print(f"⚠️ No YY- prefix, left without year: {path}")
+    for path in unconfirmed:
+        updated[path.split("/")[0]] -= 1
+        print(f"❌ Update not confirmed, still without year: {path}")
+    print(f"{'🔎 Would update' if dry_run else '✅ Updated'} {sum(updated.values())} documents: {dict(updated)}")
+
+    if unconfirmed:
+        print(f"⚠️ {len(unconfirmed)} updates not confirmed, not marking {'/'.join(MIGRATION_DOC)}; run the migration again")
+    elif not dry_run and not unparsable:
+        db.collection(MIGRATION_DOC[0]).document(MIGRATION_DOC[1]).set({
+            "migrated": True,
+            "migrated_at": datetime.now(timezone.utc),
+            "documents": sum(updated.values()),
+        })
+        print(f"🏁 Marked {'/'.join(MIGRATION_DOC)} as migrated")
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the year field on existing patient documents.")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the documents that need a year")
+    args = parser.parse_args()
+
+    db = initialize_firestore()
+    migrate_patient_years(db, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import random
+import time
+from selenium.common.exceptions import (
+    InvalidSessionIdException,
+    NoSuchWindowException,
+    StaleElementReferenceException,
+)
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from rate_controller import RateController
+
+# Failure classes
+TIMEOUT = "timeout"
+LOGGED_OUT = "logged_out"
+SERVER_ERROR = "server_error"
+STALE_WINDOW = "stale_window"
+
+TABLE_READY = (By.CSS_SELECTOR, "table.table")
+TABLE_ROWS = (By.CSS_SELECTOR, "table.table tbody tr")
+DETAIL_READY = (By.PARTIAL_LINK_TEXT, "Initial Care")
+
+SERVER_ERROR_MARKERS = (
+    "server error",
+    "bad gateway",
+    "service unavailable",
+    "gateway timeout",
+    "too many requests",
+)
+
+
+class NavigationError(Exception):
+    """
+    Raised when a page could not be loaded after all retries.
+    kind is one of TIMEOUT, LOGGED_OUT, SERVER_ERROR or STALE_WINDOW.
+    """
+
+    def __init__(self, url, kind, message=""):
+        super().__init__(f"{kind} while loading {url}: {message}")
+        self.url = url
+        self.kind = kind
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised when WRMD looks unavailable and the run should stop instead of retrying.
+    """
+
+
+class CircuitBreaker:
+    """
+    Counts consecutive failed page loads; once threshold is reached every further
+    load raises CircuitOpenError until a load succeeds again.
+    """
+
+    def __init__(self, threshold=8):
+        self.threshold = threshold
+        self.consecutive_failures = 0
+        self.last_kind = None
+
+    @property
+    def is_open(self):
+        return self.consecutive_failures >= self.threshold
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.last_kind = None
+
+    def record_failure(self, kind):
+        self.consecutive_failures += 1
+        self.last_kind = kind
+
+    def check(self):
+        if self.is_open:
+            raise CircuitOpenError(
+                f"WRMD unavailable: {self.consecutive_failures} consecutive failed loads (last: {self.last_kind})"
+            )
+
+
+class Navigator:
+    """
+    Single entry point for WRMD list and detail page loads.
+    Failures are classified, an expired session triggers relogin(), other failures
+    back off exponentially with jitter, and a CircuitBreaker ends the run early
+    when WRMD stops responding. A recovery that fails itself (relogin or restart
+    raising) counts as another failed attempt and backs off the same way. Every request to WRMD goes through a RateController,
+    which paces requests and picks the load timeout from observed latency.
+    before_load() is called ahead of every list load, after_load() once a load succeeded,
+    and restart() replaces a browser whose session is gone; all are optional and
+    supplied by DriverManager.
+    """
+
+    def __init__(self, driver, wait, relogin, max_attempts=4, base_delay=2.0, max_delay=30.0,
+                 max_relogins=3, breaker=None, controller=None, before_load=None, after_load=None, restart=None):
+        self.driver = driver
+        self.wait = wait
+        self.relogin = relogin
+        self.before_load = before_load
+        self.after_load = after_load
+        self.restart = restart
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_relogins = max_relogins
+        self.relogins = 0
+        # URL of the last successful load, so callers can tell which list page is showing
+        self.last_url = None
+        self.breaker = breaker or CircuitBreaker()
+        self.controller = controller or RateController()
+
+    def backoff(self, attempt):
+        """
+        Exponential backoff with equal jitter: half the delay is fixed, half is random.
+        """
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def classify(self, error):
+        if isinstance(error, (InvalidSessionIdException, NoSuchWindowException, StaleElementReferenceException)):
+            return STALE_WINDOW
+        try:
+            current_url = self.driver.current_url.lower()
+            if "signin" in current_url or "login" in current_url:
+                return LOGGED_OUT
+            if self.driver.find_elements(By.ID, "password"):
+                return LOGGED_OUT
+            page_source = self.driver.page_source[:5000].lower()
+        except (InvalidSessionIdException, NoSuchWindowException):
+            return STALE_WINDOW
+        except Exception:
+            return TIMEOUT
+        if any(marker in page_source for marker in SERVER_ERROR_MARKERS):
+            return SERVER_ERROR
+        return TIMEOUT
+
+    def recover(self, kind):
+        """
+        Brings the browser back to a usable state for the given failure class.
+        """
+        if kind == LOGGED_OUT:
+            if self.relogins >= self.max_relogins:
+                raise CircuitOpenError(f"Session expired {self.relogins} times; giving up on re-login")
+            self.relogins += 1
+            print(f"      🔑 Session expired - logging in again ({self.relogins}/{self.max_relogins})")
+            self.relogin()
+        elif kind == STALE_WINDOW:
+            try:
+                handles = self.driver.window_handles
+                if not handles:
+                    raise NoSuchWindowException("no open windows")
+                self.driver.switch_to.window(handles[0])
+            except (InvalidSessionIdException, NoSuchWindowException):
+                if self.restart is None:
+                    raise
+                self.restart("stale session")
+
+    def load(self, url, locator=TABLE_READY, timeout=None, page_kind="list"):
+        """
+        Loads url and waits for locator (timeout defaults to the controller's suggestion
+        for page_kind, "list" or "detail").
+        Returns on success, raises NavigationError after max_attempts failures or
+        CircuitOpenError when the breaker trips.
+        """
+        if self.before_load is not None:
+            self.before_load()
+        self._load(url, locator, timeout, page_kind)
+
+    def _load(self, url, locator, timeout, page_kind="list"):
+        kind, last_error = None, None
+        self.last_url = None
+        for attempt in range(1, self.max_attempts + 1):
+            self.breaker.check()
+            started = self.controller.acquire()
+            try:
+                self.driver.get(url)
+                WebDriverWait(self.driver, timeout or self.controller.timeout(page_kind)).until(
+                    EC.presence_of_element_located(locator))
+                self.controller.release(started, page_kind=page_kind)
+                self.breaker.record_success()
+                self.last_url = url
+                if self.after_load is not None:
+                    self.after_load()
+                return
+            except Exception as e:
+                kind, last_error = self.classify(e), e
+                self.controller.release(started, kind, page_kind)
+                self.breaker.record_failure(kind)
+                print(f"   ⚠️ {kind} loading {url} (attempt {attempt}/{self.max_attempts}): {str(e)[:200]}")
+
+            recovered = False
+            try:
+                self.recover(kind)
+                recovered = True
+            except CircuitOpenError:
+                raise
+            except (InvalidSessionIdException, NoSuchWindowException) as e:
+                if self.restart is None:
+                    raise NavigationError(url, STALE_WINDOW, str(e)) from e
+                last_error = e
+            except Exception as e:
+                # e.g. the sign-in page timing out during relogin, or Chrome failing to relaunch
+                last_error = e
+            if not recovered:
+                self.breaker.record_failure(kind)
+                print(f"   ⚠️ Recovery from {kind} failed (attempt {attempt}/{self.max_attempts}): {str(last_error)[:200]}")
+
+            # A successful fresh login is its own remedy; everything else waits before retrying
+            if (kind != LOGGED_OUT or not recovered) and attempt < self.max_attempts:
+                time.sleep(self.backoff(attempt))
+
+        raise NavigationError(url, kind, str(last_error)[:200])
+
+    def wait_for_rows(self, timeout=10):
+        """
+        Waits until the patient table has at least one row; returns the rows found.
+        """
+        try:
+            WebDriverWait(self.driver, timeout).until(lambda d: len(d.find_elements(*TABLE_ROWS)) > 0)
+        except Exception:
+            print("⚠️ No rows found yet, waiting longer...")
+            time.sleep(3)
+        return self.driver.find_elements(*TABLE_ROWS)
@@ -0,0 +1,193 @@
+from dataclasses import dataclass, fields
+from datetime import date, datetime
+from functools import lru_cache
+from firebase_setup import match_species_name, match_age_stage
+from year_schedule import prefix_year
+
+WRMD_DATE_FORMAT = "%m/%d/%Y"
+INTAKE_DATE_FORMAT = "%B %d, %Y"
+
+# List columns read into a ScrapedRow: case number, species, disposition, date admitted
+ROW_COLUMNS = (1, 2, 4, 8)
+
+CLOSED_DISPOSITIONS = ("died", "euthanized", "released", "dead", "transferred", "void")
+
+# Fields each collection stores besides the common ones
+COLLECTION_FIELDS = {
+    "patients_in_care": ("wrmd_species", "age_stage"),
+    "other_patients": ("age_stage",),
+    "failed_patients": ("wrmd_species", "raw_age", "reason"),
+}
+COMMON_FIELDS = ("page_number", "patient_id", "species", "status", "intake_date", "last_checked")
+
+
+@lru_cache(maxsize=4096)
+def parse_wrmd_date(text):
+    """
+    Parses a WRMD list date (MM/DD/YYYY); returns None if it is not a valid date.
+    """
+    try:
+        return datetime.strptime(text, WRMD_DATE_FORMAT).date()
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def format_intake_date(day):
+    return day.strftime(INTAKE_DATE_FORMAT)
+
+
+@lru_cache(maxsize=4096)
+def parse_intake_date(text):
+    """
+    Parses a stored intake_date ("March 03, 2025"); returns None if it cannot be parsed.
+    """
+    try:
+        return datetime.strptime(text, INTAKE_DATE_FORMAT).date()
+    except (TypeError, ValueError):
+        return None
+
+
+def patient_year(patient_id):
+    """
+    Admission year from a WRMD case number ("25-123" -> 2025); None if it has no YY- prefix.
+    """
+    return prefix_year((patient_id or "").partition("-")[0])
+
+
+def is_closed_disposition(disposition):
+    return any(word in disposition for word in CLOSED_DISPOSITIONS)
+
+
+@dataclass(slots=True, frozen=True)
+class ScrapedRow:
+    """
+    One row of the WRMD patient list.
+    disposition is lowercased; date_admitted is None when the list shows an invalid date.
+    age_stage is the raw value from the detail page, once it has been read.
+    """
+    case_number: str
+    species: str
+    disposition: str
+    date_admitted: date | None
+    page_number: int
+    age_stage: str | None = None
+
+    @classmethod
+    def from_cells(cls, cells, page_number):
+        """
+        Builds a row from the <td> elements of a list row (case number, species,
+        disposition and date admitted columns).
+        """
+        texts = [cell.text if index in ROW_COLUMNS else "" for index, cell in enumerate(cells)]
+        return cls.from_texts(texts, page_number)
+
+    @classmethod
+    def from_texts(cls, texts, page_number):
+        """
+        Builds a row from the cell texts of a list row.
+        """
+        return cls(
+            case_number=texts[1].strip(),
+            species=texts[2].strip(),
+            disposition=texts[4].strip().lower(),
+            date_admitted=parse_wrmd_date(texts[8].strip()) if len(texts) > 8 else None,
+            page_number=page_number,
+        )
+
+    @property
+    def is_pending(self):
+        return self.disposition == "pending"
+
+    @property
+    def is_closed(self):
+        return is_closed_disposition(self.disposition)
+
+    @property
+    def intake_date(self):
+        return format_intake_date(self.date_admitted) if self.date_admitted else ""
+
+
+@dataclass(slots=True)
+class PatientRecord:
+    """
+    A patient document in patients_in_care, other_patients or failed_patients.
+    to_firestore() emits only the fields the target collection stores.
+    """
+    collection: str
+    patient_id: str
+    page_number: int
+    species: str | None
+    intake_date: str
+    last_checked: str
+    status: str = "Pending"
+    wrmd_species: str | None = None
+    age_stage: str | None = None
+    raw_age: str | None = None
+    reason: str | None = None
+
+    def to_firestore(self):
+        data = {name: getattr(self, name) for name in COMMON_FIELDS}
+        # Indexed so readers can query one admission year instead of the whole history
+        data["year"] = patient_year(self.patient_id)
+        for name in COLLECTION_FIELDS[self.collection]:
+            value = getattr(self, name)
+            if value is not None or name != "reason":
+                data[name] = value
+        return data
+
+    @classmethod
+    def from_firestore(cls, collection, data):
+        known = {f.name for f in fields(cls)} - {"collection"}
+        values = {k: v for k, v in data.items() if k in known}
+        values.setdefault("patient_id", "")
+        values.setdefault("page_number", 1)
+        values.setdefault("species", None)
+        values.setdefault("intake_date", "")
+        values.setdefault("last_checked", "")
+        return cls(collection=collection, **values)
+
+    def content_key(self):
+        """
+        The typed fields that matter for equality; last_checked is bookkeeping only.
+        """
+        return tuple(getattr(self, f.name) for f in fields(self) if f.name != "last_checked")
+
+    def same_content(self, other):
+        return self.content_key() == other.content_key()
+
+    def matches(self, data):
+        """
+        True if the stored document data has the same content as this record.
+        """
+        return self.same_content(PatientRecord.from_firestore(self.collection, data))
+
+    @property
+    def display_age(self):
+        return self.age_stage if self.age_stage is not None else self.raw_age
+
+
+def classify_patient(row, last_checked):
+    """
+    Decides where a newly scraped pending patient belongs and returns its PatientRecord:
+    patients_in_care when species and age stage both match, failed_patients when only
+    the age stage is unusable, other_patients for untracked species.
+    """
+    age_stage_raw = row.age_stage
+    matched_species = match_species_name(row.species)
+    matched_age = match_age_stage(age_stage_raw if age_stage_raw else "")
+    common = dict(
+        patient_id=row.case_number,
+        page_number=row.page_number,
+        intake_date=row.intake_date,
+        last_checked=last_checked,
+    )
+
+    if matched_species is None:
+        return PatientRecord(collection="other_patients", species=row.species,
+                             age_stage=matched_age if matched_age else age_stage_raw, **common)
+    if matched_age is None:
+        return PatientRecord(collection="failed_patients", species=matched_species, wrmd_species=row.species,
+                             raw_age=age_stage_raw if age_stage_raw else "", **common)
+    return PatientRecord(collection="patients_in_care", species=matched_species, wrmd_species=row.species,
+                         age_stage=matched_age, **common)
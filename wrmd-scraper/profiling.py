@@ -0,0 +1,188 @@
+import contextlib
+import linecache
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+RUNS_DIR = os.environ.get(
+    "WRMD_RUNS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "runs")
+)
+SAMPLE_INTERVAL = float(os.environ.get("WRMD_PROFILE_INTERVAL", "0.005"))
+TOP_N = 25
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Library frames that mark a sample as waiting on an external system
+CATEGORY_MARKERS = (
+    ("selenium", (f"{os.sep}selenium{os.sep}", f"{os.sep}urllib3{os.sep}")),
+    ("firestore", (f"{os.sep}google{os.sep}", f"{os.sep}firebase_admin{os.sep}", f"{os.sep}grpc{os.sep}")),
+)
+
+
+def frame_label(frame):
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}.{code.co_name}"
+
+
+def is_repo_frame(frame):
+    filename = os.path.abspath(frame.f_code.co_filename)
+    return os.path.dirname(filename) == REPO_DIR
+
+
+def categorize(frames):
+    """
+    frames run from the outermost call to the sampled one. Returns (category, call site):
+    the category is selenium/firestore when a library frame of theirs is on the stack,
+    sleep when the innermost frame is on a time.sleep line, otherwise python; the call site
+    is the innermost repo frame (module.function:line).
+    """
+    call_site = None
+    for frame in frames:
+        if is_repo_frame(frame):
+            call_site = f"{frame_label(frame)}:{frame.f_lineno}"
+
+    filenames = [frame.f_code.co_filename for frame in frames]
+    for category, markers in CATEGORY_MARKERS:
+        if any(marker in filename for filename in filenames for marker in markers):
+            return category, call_site
+
+    leaf = frames[-1]
+    if "sleep(" in linecache.getline(leaf.f_code.co_filename, leaf.f_lineno):
+        return "sleep", call_site
+    return "python", call_site
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every non-daemon thread (the main thread and executor workers such
+    as the Chrome launcher) every `interval` seconds from a background thread.
+    Wall-clock based: a thread blocked in a WebDriver or Firestore call keeps being
+    sampled at that call, so blocking time is attributed to the call site that made it.
+    Each sampling round takes one sample per thread, and a sample stands for the measured
+    elapsed / rounds seconds (the interval plus the time spent walking stacks). Times are
+    kept per thread, so each thread's categories add up to at most the wall time.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.categories = Counter()
+        self.call_sites = Counter()
+        self.samples = 0
+        self.rounds = 0
+        self.started = None
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.rounds += 1
+            sampled = {t.ident: t.name for t in threading.enumerate() if not t.daemon}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or ident not in sampled:
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(frame)
+                    frame = frame.f_back
+                frames.reverse()
+                self._record(sampled[ident], frames)
+
+    def _record(self, thread, frames):
+        self.samples += 1
+        category, call_site = categorize(frames)
+        # The thread is the root frame, so flamegraphs show one tower per thread
+        self.stacks[";".join([thread] + [frame_label(frame) for frame in frames])] += 1
+        self.categories[(thread, category)] += 1
+        if call_site is not None:
+            self.call_sites[(thread, category, call_site)] += 1
+
+    def seconds(self, count):
+        """
+        Wall seconds represented by count samples of one thread.
+        """
+        return count * self.elapsed / max(1, self.rounds)
+
+    def hot_functions(self, top=TOP_N):
+        """
+        Returns (self, inclusive) Counters of samples per function.
+        """
+        self_counts, inclusive = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            labels = stack.split(";")[1:]
+            self_counts[labels[-1]] += count
+            for label in set(labels):
+                inclusive[label] += count
+        return self_counts.most_common(top), inclusive.most_common(top)
+
+    def write(self, run_dir):
+        """
+        Writes profile.collapsed (flamegraph.pl / speedscope input) and profile_summary.txt.
+        """
+        os.makedirs(run_dir, exist_ok=True)
+        with open(os.path.join(run_dir, "profile.collapsed"), "w") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+        rounds = max(1, self.rounds)
+        self_top, inclusive_top = self.hot_functions()
+        lines = [
+            f"Wall time {self.elapsed:.1f}s, {self.rounds} sampling rounds "
+            f"(every {self.elapsed * 1000 / rounds:.1f}ms measured, {self.interval * 1000:.0f}ms requested), "
+            f"{self.samples} samples",
+            "",
+            "Time by thread and category (% of wall time):",
+        ]
+        lines += [f"  {thread:<20} {category:<10} {self.seconds(count):8.1f}s  {100 * count / rounds:5.1f}%"
+                  for (thread, category), count in self.categories.most_common()]
+        lines += ["", "Top call sites (innermost repo frame) by thread and category:"]
+        lines += [f"  {thread:<20} {category:<10} {self.seconds(count):8.1f}s  {site}"
+                  for (thread, category, site), count in self.call_sites.most_common(TOP_N)]
+        lines += ["", "Top functions by self time (summed over threads):"]
+        lines += [f"  {self.seconds(count):8.1f}s  {label}" for label, count in self_top]
+        lines += ["", "Top functions by inclusive time (summed over threads):"]
+        lines += [f"  {self.seconds(count):8.1f}s  {label}" for label, count in inclusive_top]
+
+        with open(os.path.join(run_dir, "profile_summary.txt"), "w") as f:
+            f.write("\n".join(lines) + "\n")
+        return lines
+
+
+@contextlib.contextmanager
+def profile_run(name, enabled=True):
+    """
+    Profiles the enclosed block and writes its artifacts to runs/<timestamp>-<name>/,
+    also when the block raises. Does nothing unless enabled.
+    """
+    if not enabled:
+        yield None
+        return
+
+    profiler = SamplingProfiler()
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        run_dir = os.path.join(RUNS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{name}")
+        lines = profiler.write(run_dir)
+        print("\n".join(["", "🔬 Profile:"] + lines[:12]))
+        print(f"🔬 Profile written to {run_dir}")
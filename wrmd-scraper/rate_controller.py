@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from collections import deque
+
+MAX_IN_FLIGHT = int(os.environ.get("WRMD_MAX_IN_FLIGHT", "4"))
+MIN_INTERVAL = float(os.environ.get("WRMD_MIN_REQUEST_INTERVAL", "0"))
+MAX_INTERVAL = float(os.environ.get("WRMD_MAX_REQUEST_INTERVAL", "10"))
+# p95 latency above which WRMD counts as congested
+TARGET_P95 = float(os.environ.get("WRMD_TARGET_P95_SECONDS", "15"))
+# Latency is tracked per page kind: list pages are much slower than patient detail pages
+PAGE_KINDS = ("list", "detail")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class RateController:
+    """
+    AIMD limiter for WRMD requests, shared by every page and detail load of a run.
+
+    Each request waits for a slot (at most `limit` in flight, never above `ceiling`) and for
+    `interval` seconds since the previous request started. After every request:
+      - a timeout or server error, or a window p95 above target_p95, halves the limit and
+        doubles the interval (at most once per `window` requests, so one slow burst counts once)
+      - a success grows the limit by 1/limit (about +1 per limit successes) and shrinks the
+        interval by interval_step
+      - any other failure (logged out, stale window) says nothing about WRMD's load and
+        changes neither.
+    Latencies are kept in one window per page kind (list, detail), and timeout(page_kind)
+    suggests a page-load timeout from that kind's p95 instead of fixed values.
+    """
+
+    def __init__(self, ceiling=MAX_IN_FLIGHT, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 target_p95=TARGET_P95, window=40, interval_step=0.25,
+                 min_timeout=20.0, max_timeout=90.0, timeout_factor=3.0):
+        self.ceiling = max(1, ceiling)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_p95 = target_p95
+        self.window = window
+        self.interval_step = interval_step
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_factor = timeout_factor
+
+        self.limit = 1.0
+        self.interval = min_interval
+        self.in_flight = 0
+        self.latencies = {kind: deque(maxlen=window) for kind in PAGE_KINDS}
+        self.failures = deque(maxlen=window)
+        self.last_start = 0.0
+        self.since_decrease = window
+        self.requests = 0
+        self.increases = 0
+        self.decreases = 0
+        self.decisions = deque(maxlen=20)
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """
+        Blocks until a request may start; returns its start time for release().
+        """
+        with self._cond:
+            while self.in_flight >= min(self.ceiling, int(self.limit)):
+                self._cond.wait()
+            self.in_flight += 1
+            delay = self.last_start + self.interval - time.monotonic()
+            self.last_start = time.monotonic() + max(0.0, delay)
+        if delay > 0:
+            time.sleep(delay)
+        return time.monotonic()
+
+    def release(self, started, failure_kind=None, page_kind="list"):
+        """
+        Records a finished request. failure_kind is a navigation failure class, or None on success;
+        only timeouts and server errors count against WRMD. page_kind is "list" or "detail".
+        """
+        latency = time.monotonic() - started
+        congested = failure_kind in ("timeout", "server_error")
+        with self._cond:
+            self.in_flight -= 1
+            self.requests += 1
+            self.since_decrease += 1
+            self.failures.append(congested)
+            latencies = self.latencies[page_kind]
+            # A logged-out or stale page returns early; its latency says nothing about WRMD
+            if failure_kind is None or congested:
+                latencies.append(latency)
+
+            p95 = percentile(latencies, 0.95)
+            slow = len(latencies) >= 5 and p95 > self.target_p95
+            if (congested or slow) and self.since_decrease >= self.window:
+                self.limit = max(1.0, self.limit / 2)
+                self.interval = min(self.max_interval, max(self.interval * 2, self.interval_step))
+                self.since_decrease = 0
+                self.decreases += 1
+                self._decide("decrease", failure_kind or f"{page_kind} p95 {p95:.1f}s")
+            elif failure_kind is None and not slow:
+                old_limit, old_interval = int(self.limit), self.interval
+                self.limit = min(float(self.ceiling), self.limit + 1 / self.limit)
+                self.interval = max(self.min_interval, self.interval - self.interval_step)
+                if int(self.limit) != old_limit or self.interval != old_interval:
+                    self.increases += 1
+                    self._decide("increase", f"{page_kind} p95 {p95:.1f}s")
+            self._cond.notify_all()
+
+    def _decide(self, action, reason):
+        self.decisions.append({
+            "request": self.requests,
+            "action": action,
+            "reason": reason,
+            "limit": int(self.limit),
+            "interval_s": round(self.interval, 2),
+        })
+
+    def timeout(self, page_kind="list"):
+        """
+        Page-load timeout: timeout_factor x the observed p95 of this page kind,
+        within [min_timeout, max_timeout].
+        """
+        with self._cond:
+            latencies = self.latencies[page_kind]
+            p95 = percentile(latencies, 0.95) if len(latencies) >= 5 else None
+        if p95 is None:
+            return 30.0
+        return min(self.max_timeout, max(self.min_timeout, p95 * self.timeout_factor))
+
+    def summary(self):
+        with self._cond:
+            latency = {}
+            for kind, latencies in self.latencies.items():
+                p50, p95 = percentile(latencies, 0.5), percentile(latencies, 0.95)
+                latency[f"{kind}_p50_s"] = round(p50, 2) if p50 is not None else None
+                latency[f"{kind}_p95_s"] = round(p95, 2) if p95 is not None else None
+            return {
+                "requests": self.requests,
+                "limit": int(self.limit),
+                "ceiling": self.ceiling,
+                "interval_s": round(self.interval, 2),
+                **latency,
+                "failure_rate": round(sum(self.failures) / len(self.failures), 3) if self.failures else 0.0,
+                "increases": self.increases,
+                "decreases": self.decreases,
+                "decisions": list(self.decisions),
+            }
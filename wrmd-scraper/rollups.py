@@ -0,0 +1,91 @@
+from patient_record import parse_intake_date
+
+ROLLUP_COLLECTION = "rollups"
+
+
+def rollup_key(species, age_stage):
+    return f"{species or 'Unknown'}/{age_stage or 'Unknown'}"
+
+
+def fold_rollup(doc, changes, occupancy, run_id, day):
+    """
+    Folds one run into a daily rollup document and returns the new document.
+
+    doc        existing rollup data ({} for a new day)
+    changes    RunChanges of the run
+    occupancy  {(species, age_stage): number in care} after the run
+    run_id     identifies the run; folding the same run twice replaces its sample
+    day        the Pacific calendar date of the run
+
+    occupancy samples are stored column-wise: sample_runs lists the runs and
+    occupancy[key] holds one count per run in the same order. Admissions and
+    discharges are keyed by case number so repeated folds never double count.
+    """
+    sample_runs = list(doc.get("sample_runs", []))
+    series = {key: list(values) for key, values in doc.get("occupancy", {}).items()}
+
+    if run_id in sample_runs:
+        index = sample_runs.index(run_id)
+    else:
+        sample_runs.append(run_id)
+        index = len(sample_runs) - 1
+
+    counts = {rollup_key(species, age): n for (species, age), n in occupancy.items()}
+    for key in set(series) | set(counts):
+        values = series.setdefault(key, [])
+        values.extend([0] * (len(sample_runs) - len(values)))
+        values[index] = counts.get(key, 0)
+
+    admitted = dict(doc.get("admitted", {}))
+    for pid, entry in list(changes.added.items()) + list(changes.moved.items()):
+        if entry["collection"] == "patients_in_care":
+            admitted[pid] = rollup_key(entry["species"], entry["age_stage"])
+
+    discharged = dict(doc.get("discharged", {}))
+    for pid, entry in changes.removed.items():
+        if entry["collection"] == "failed_patients":
+            continue
+        intake = parse_intake_date(entry["intake_date"])
+        stay_days = (day - intake).days if intake else None
+        discharged[pid] = [rollup_key(entry["species"], entry["age_stage"]), stay_days]
+
+    admission_counts = {}
+    for key in admitted.values():
+        admission_counts[key] = admission_counts.get(key, 0) + 1
+
+    discharge_counts, stay_days_total = {}, {}
+    for key, stay_days in discharged.values():
+        discharge_counts[key] = discharge_counts.get(key, 0) + 1
+        if stay_days is not None:
+            stay_days_total[key] = stay_days_total.get(key, 0) + stay_days
+
+    return {
+        "date": day.isoformat(),
+        "sample_runs": sample_runs,
+        "occupancy": series,
+        "admitted": admitted,
+        "admission_counts": admission_counts,
+        "discharged": discharged,
+        "discharge_counts": discharge_counts,
+        "stay_days_total": stay_days_total,
+    }
+
+
+def write_daily_rollup(db, changes, occupancy, run_start):
+    """
+    Folds this run into rollups/{YYYY-MM-DD} (Pacific date of run_start) in a transaction.
+    """
+    from firebase_admin import firestore
+
+    day = run_start.date()
+    run_id = run_start.isoformat(timespec="seconds")
+    ref = db.collection(ROLLUP_COLLECTION).document(day.isoformat())
+
+    @firestore.transactional
+    def transaction_op(transaction):
+        snapshot = ref.get(transaction=transaction)
+        doc = snapshot.to_dict() if snapshot.exists else {}
+        transaction.set(ref, fold_rollup(doc, changes, occupancy, run_id, day))
+
+    transaction_op(db.transaction())
+    print(f"📈 Folded run into {ROLLUP_COLLECTION}/{day.isoformat()}: {changes.summary()}")
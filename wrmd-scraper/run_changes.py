@@ -0,0 +1,64 @@
+class RunChanges:
+    """
+    Collects what a sync run did to the patient collections, keyed by case number:
+    added (new documents), moved (failed_patients -> patients_in_care/other_patients),
+    updated (documents rewritten in place, e.g. a failed patient's new raw_age)
+    and removed (documents deleted because the patient left care).
+    Each entry keeps the collection and the document fields at the time of the change.
+    Once attached to a RunJournal every entry is also journaled, so a run that is killed
+    before publishing hands its changes to the next one.
+    """
+
+    BUCKETS = ("added", "moved", "updated", "removed")
+
+    def __init__(self):
+        self.added = {}
+        self.moved = {}
+        self.updated = {}
+        self.removed = {}
+        # Set when unpublished changes of an earlier run could not be recovered
+        self.full_reload = False
+        self._journal = None
+
+    def __bool__(self):
+        return bool(self.full_reload or self.added or self.moved or self.updated or self.removed)
+
+    def attach(self, journal):
+        """
+        Takes over the changes the journal carried from an unpublished run and journals every new one.
+        """
+        for bucket in self.BUCKETS:
+            getattr(self, bucket).update(journal.changes.get(bucket, {}))
+        self.full_reload = journal.changes_lost
+        self._journal = journal
+        if self:
+            print(f"📓 Carrying unpublished changes of the previous run: {self.summary()}"
+                  + (" (lost, clients will reload)" if self.full_reload else ""))
+
+    def _record(self, bucket, patient_id, entry):
+        getattr(self, bucket)[patient_id] = entry
+        if self._journal is not None:
+            self._journal.record_change(bucket, patient_id, entry)
+
+    def record_add(self, record):
+        self._record("added", record.patient_id, {"collection": record.collection, **record.to_firestore()})
+
+    def record_move(self, from_collection, record):
+        self._record("moved", record.patient_id,
+                     {"from": from_collection, "collection": record.collection, **record.to_firestore()})
+
+    def record_update(self, record):
+        self._record("updated", record.patient_id, {"collection": record.collection, **record.to_firestore()})
+
+    def record_remove(self, collection, patient_id, data, disposition=""):
+        self._record("removed", patient_id, {
+            "collection": collection,
+            "species": data.get("species"),
+            "age_stage": data.get("age_stage"),
+            "intake_date": data.get("intake_date", ""),
+            "disposition": disposition,
+        })
+
+    def summary(self):
+        return {"added": len(self.added), "moved": len(self.moved), "updated": len(self.updated),
+                "removed": len(self.removed)}
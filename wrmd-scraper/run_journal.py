@@ -0,0 +1,296 @@
+import json
+import os
+from datetime import datetime, timezone
+
+JOURNAL_PATH = os.environ.get(
+    "WRMD_JOURNAL_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "wrmd_journal.jsonl")
+)
+# An interrupted run older than this is not resumed; WRMD pages will have shifted by then
+JOURNAL_MAX_AGE_HOURS = float(os.environ.get("WRMD_JOURNAL_MAX_AGE_HOURS", "6"))
+JOURNAL_DOC = ("system", "sync_journal")
+# Markers written in the same transaction as a capacity delta (see firebase_setup.update_capacity_count)
+APPLIED_OPS_COLLECTION = "applied_ops"
+
+
+def page_key(year, phase, page):
+    return f"{year}/{phase}/{page}"
+
+
+class RunJournal:
+    """
+    Append-only checkpoint journal for one sync run.
+
+    Every entry is one JSON line, flushed and fsynced before the call returns:
+      start   a run began (run_id, started_at)
+      page    a list page was fully processed (year, phase, page)
+      begin   a per-patient operation started (key, payload)
+      step    a non-idempotent step of it was applied, e.g. a capacity delta (key, step)
+      done    the operation completed (key)
+      change  a RunChanges entry (bucket, pid, entry), see RunChanges.attach()
+      published  every change so far reached the change feed and the daily rollup
+      finish  the run completed
+
+    If the previous run never wrote finish, start() replays its journal: completed pages
+    are skipped and operations that began but did not finish are handed back through
+    pending_ops() so the caller can complete them without re-applying finished steps.
+    A step is journaled after it is applied, so a crash in between leaves it unrecorded;
+    capacity deltas are therefore also keyed by op_id() in Firestore itself, and markers
+    of runs that can no longer resume are pruned by start().
+    The state is mirrored to system/sync_journal after each page and at the end, which lets
+    a fresh machine resume from the last page checkpoint when the local file is gone.
+
+    Changes are only published from the sync's finally block, which a hard kill skips. So
+    RunChanges entries are journaled too, and whatever the previous run recorded but never
+    marked published is carried into this run (resumed or not) and published with it.
+    The mirror does not hold the entries; if they have to be recovered from it,
+    changes_lost is set and the next feed entry asks clients for a full reload.
+    """
+
+    def __init__(self, db, path=JOURNAL_PATH):
+        self.db = db
+        self.path = path
+        self.run_id = None
+        self.started_at = None
+        self.resumed = False
+        self.pages = set()
+        self.ops = {}
+        self.changes = {}
+        self.changes_lost = False
+        self.status = None
+        self._file = None
+
+    # -------- lifecycle --------
+
+    def start(self, run_id):
+        """
+        Resumes the unfinished run found locally or in Firestore, otherwise starts run_id.
+        Returns True when resuming.
+        """
+        state = self._read_local() or self._read_mirror()
+        if state is not None and not state.get("published", True):
+            # Recorded by the previous run but never published
+            self.changes = state.get("changes") or {}
+            self.changes_lost = state.get("changes") is None or state.get("changes_lost", False)
+        if state is not None and not state.get("finished") and self._is_fresh(state.get("started_at")):
+            self.run_id = state["run_id"]
+            self.started_at = state["started_at"]
+            self.pages = set(state.get("pages", []))
+            self.ops = state.get("ops", {})
+            self.resumed = True
+        else:
+            self.run_id = run_id
+            self.started_at = datetime.now(timezone.utc).isoformat()
+
+        # Rewrite the file compactly (atomically) so it only ever holds the current run
+        entries = [{"t": "start", "run_id": self.run_id, "started_at": self.started_at}]
+        entries += [{"t": "page", "key": key} for key in sorted(self.pages)]
+        for key, op in self.ops.items():
+            entries.append({"t": "begin", "key": key, "payload": op["payload"]})
+            entries += [{"t": "step", "key": key, "step": step} for step in op["steps"]]
+            if op["done"]:
+                entries.append({"t": "done", "key": key})
+        for bucket, bucket_changes in self.changes.items():
+            entries += [{"t": "change", "bucket": bucket, "pid": pid, "entry": entry}
+                        for pid, entry in bucket_changes.items()]
+        if self.changes_lost:
+            entries.append({"t": "lost"})
+        with open(self.path + ".tmp", "w") as f:
+            f.writelines(json.dumps(entry) + "\n" for entry in entries)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.path + ".tmp", self.path)
+        self._file = open(self.path, "a")
+
+        if self.resumed:
+            print(f"📓 Resuming run {self.run_id}: {len(self.pages)} pages done, "
+                  f"{len(self.pending_ops())} unfinished operations")
+        self._mirror("running")
+        self._prune_applied_ops()
+        return self.resumed
+
+    def finish(self):
+        self._append({"t": "finish"})
+        self._mirror("finished")
+
+    def interrupt(self, error):
+        """
+        Marks the mirror as interrupted; the local journal stays unfinished so the next run resumes.
+        """
+        self._mirror("interrupted", error=str(error)[:500])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # -------- pages --------
+
+    def is_page_done(self, year, phase, page):
+        return page_key(year, phase, page) in self.pages
+
+    def page_done(self, year, phase, page):
+        key = page_key(year, phase, page)
+        self.pages.add(key)
+        self._append({"t": "page", "key": key})
+        self._mirror("running")
+
+    # -------- per-patient operations --------
+
+    def is_op_done(self, key):
+        return key in self.ops and self.ops[key]["done"]
+
+    def op_begin(self, key, payload):
+        """
+        Starts (or re-enters) an operation and returns its payload; when resuming, the payload
+        recorded the first time wins so the operation finishes with the data it started with.
+        """
+        if key not in self.ops:
+            self.ops[key] = {"payload": payload, "steps": [], "done": False}
+            self._append({"t": "begin", "key": key, "payload": payload})
+        return self.ops[key]["payload"]
+
+    def has_step(self, key, step):
+        return key in self.ops and step in self.ops[key]["steps"]
+
+    def op_step(self, key, step):
+        self.ops[key]["steps"].append(step)
+        self._append({"t": "step", "key": key, "step": step})
+
+    def op_done(self, key):
+        self.ops[key]["done"] = True
+        self._append({"t": "done", "key": key})
+
+    def pending_ops(self):
+        return {key: op for key, op in self.ops.items() if not op["done"]}
+
+    def op_id(self, key):
+        """
+        Run-scoped ID of an operation, used as its applied_ops document ID.
+        """
+        return f"{self.run_id}|{key}"
+
+    # -------- run changes --------
+
+    def record_change(self, bucket, pid, entry):
+        self.changes.setdefault(bucket, {})[pid] = entry
+        self._append({"t": "change", "bucket": bucket, "pid": pid, "entry": entry})
+
+    def changes_published(self):
+        """
+        Called once the change feed and rollup have taken every recorded change.
+        """
+        self.changes = {}
+        self.changes_lost = False
+        self._append({"t": "published"})
+        self._mirror(self.status)
+
+    # -------- storage --------
+
+    def _append(self, entry):
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _read_local(self):
+        """
+        Rebuilds the journal state from the local file; a torn last line is ignored.
+        """
+        try:
+            with open(self.path) as f:
+                lines = f.readlines()
+        except OSError:
+            return None
+
+        state = None
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            kind = entry.get("t")
+            if kind == "start":
+                state = {"run_id": entry["run_id"], "started_at": entry["started_at"],
+                         "pages": set(), "ops": {}, "changes": {}, "published": False, "finished": False}
+            elif state is None:
+                continue
+            elif kind == "page":
+                state["pages"].add(entry["key"])
+            elif kind == "begin":
+                state["ops"].setdefault(entry["key"], {"payload": entry["payload"], "steps": [], "done": False})
+            elif kind == "step" and entry["key"] in state["ops"]:
+                state["ops"][entry["key"]]["steps"].append(entry["step"])
+            elif kind == "done" and entry["key"] in state["ops"]:
+                state["ops"][entry["key"]]["done"] = True
+            elif kind == "change":
+                state["changes"].setdefault(entry["bucket"], {})[entry["pid"]] = entry["entry"]
+                state["published"] = False
+            elif kind == "lost":
+                state["changes_lost"] = True
+                state["published"] = False
+            elif kind == "published":
+                state["changes"] = {}
+                state["changes_lost"] = False
+                state["published"] = True
+            elif kind == "finish":
+                state["finished"] = True
+        return state
+
+    def _read_mirror(self):
+        try:
+            snapshot = self.db.collection(JOURNAL_DOC[0]).document(JOURNAL_DOC[1]).get()
+        except Exception as e:
+            print(f"⚠️ Could not read journal mirror: {e}")
+            return None
+        if not snapshot.exists:
+            return None
+        data = snapshot.to_dict()
+        return {
+            "run_id": data.get("run_id"),
+            "started_at": data.get("started_at"),
+            "pages": data.get("pages", []),
+            "ops": data.get("ops", {}),
+            "finished": data.get("status") == "finished",
+            # Only the fact that changes are pending is mirrored, not the entries
+            "changes": None,
+            "published": data.get("changes_published", True),
+        }
+
+    def _prune_applied_ops(self):
+        """
+        Deletes the applied_ops markers of earlier runs; only the current run can still resume.
+        """
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        try:
+            stale = self.db.collection(APPLIED_OPS_COLLECTION).where(filter=FieldFilter("run_id", "!=", self.run_id))
+            for doc in stale.stream():
+                doc.reference.delete()
+        except Exception as e:
+            print(f"⚠️ Could not prune applied_ops: {e}")
+
+    def _is_fresh(self, started_at):
+        try:
+            started = datetime.fromisoformat(started_at)
+        except (TypeError, ValueError):
+            return False
+        return (datetime.now(timezone.utc) - started).total_seconds() < JOURNAL_MAX_AGE_HOURS * 3600
+
+    def _mirror(self, status, error=None):
+        self.status = status
+        data = {
+            "run_id": self.run_id,
+            "started_at": self.started_at,
+            "status": status,
+            "changes_published": not self.changes and not self.changes_lost,
+            "resumed": self.resumed,
+            "pages": sorted(self.pages),
+            "ops": self.ops if status != "finished" else {},
+            "updated_at": datetime.now(timezone.utc),
+        }
+        if error is not None:
+            data["error"] = error
+        try:
+            self.db.collection(JOURNAL_DOC[0]).document(JOURNAL_DOC[1]).set(data)
+        except Exception as e:
+            print(f"⚠️ Could not mirror run journal: {e}")
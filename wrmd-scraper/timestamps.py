@@ -0,0 +1,20 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+PACIFIC = ZoneInfo("America/Los_Angeles")
+
+TIMESTAMP_FORMAT = "%B %d, %Y at %I:%M:%S %p"
+
+
+def pacific_now():
+    return datetime.now(PACIFIC)
+
+
+def format_timestamp(moment):
+    """
+    Formats a datetime in Pacific time the way the dashboard displays it,
+    e.g. "March 03, 2025 at 09:15:00 AM UTC-8" (UTC-7 while DST is in effect).
+    """
+    moment = moment.astimezone(PACIFIC)
+    offset_hours = int(moment.utcoffset().total_seconds() // 3600)
+    return f"{moment.strftime(TIMESTAMP_FORMAT)} UTC{offset_hours:+d}"
@@ -1,52 +1,164 @@
-from wrmd_scraper_core import (
-    launch_wrmd_driver,
-    login_to_wrmd,
-    get_pending_patients
+import time
+
+# Taken before the other imports so the startup report includes them
+PROCESS_STARTED = time.perf_counter()
+
+from driver_manager import DriverManager
+from firebase_setup import (
+    initialize_firestore,
+    update_capacity_count,
+    match_species_name,
+    match_age_stage,
+    write_record,
+    add_new_patient,
+    delete_patient
 )
-from firebase_setup import initialize_firestore, update_capacity_count, match_species_name, match_age_stage, log_message
-from datetime import datetime, timezone, timedelta
+from dataclasses import replace
+from local_cache import LocalCache
+from run_changes import RunChanges
+from run_journal import RunJournal
+from rollups import write_daily_rollup
+from changefeed import publish_changes
+from audit_capacity import audit_capacity
+from year_schedule import select_years, mark_years_checked
+from patient_record import PatientRecord, ScrapedRow, classify_patient
+from timestamps import pacific_now, format_timestamp
+from navigation import NavigationError, CircuitOpenError
+from detail_extractor import read_age_stage, snapshot_rows
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import InvalidSessionIdException, NoSuchWindowException, StaleElementReferenceException
-import time
-import platform
-from selenium.webdriver.common.keys import Keys
+
+from profiling import profile_run
+import argparse
+
+IMPORTS_DONE = time.perf_counter()
 
 PATIENT_LIST_URL = "https://www.wrmd.org/lists"
+# Deep list pages render slowly; their timeout never drops below this
+DEEP_PAGE = 15
+DEEP_PAGE_TIMEOUT = 60
+
+def list_page_timeout(nav, page):
+    """
+    Load timeout for a list page: the rate controller's suggestion, floored for deep pages.
+    """
+    timeout = nav.controller.timeout("list")
+    return max(timeout, DEEP_PAGE_TIMEOUT) if page >= DEEP_PAGE else timeout
 
-def get_wid_in_care(db):
+def get_wid_in_care(cache):
     """
-    Fetches all document IDs (wrmd_ids) in the patients_in_care, other_patients, and failed_patients collections.
+    Fetches all document IDs (wrmd_ids) in the patients_in_care, other_patients, and failed_patients collections
+    from the local cache (reconciled against Firestore at startup).
     Returns a tuple of (wrmd_ids_by_year excluding failed patients, failed_patients_by_year)
     """
-    wrmd_ids_by_year = {}
-    failed_patients_by_year = {}
-
-    for collection_name in ["patients_in_care", "other_patients", "failed_patients"]:
-        patients_ref = db.collection(collection_name)
-        docs = patients_ref.stream()
-        for doc in docs:
-            wid = doc.id
-            year_prefix = wid.split("-")[0]
-            
-            # Track failed patients separately and DON'T include them in wrmd_ids_by_year
-            if collection_name == "failed_patients":
-                if year_prefix not in failed_patients_by_year:
-                    failed_patients_by_year[year_prefix] = []
-                failed_patients_by_year[year_prefix].append(wid)
-            else:
-                # Only add patients_in_care and other_patients to wrmd_ids_by_year
-                if year_prefix not in wrmd_ids_by_year:
-                    wrmd_ids_by_year[year_prefix] = []
-                wrmd_ids_by_year[year_prefix].append(wid)
-
-    return wrmd_ids_by_year, failed_patients_by_year
-
-def check_failed_patients(driver, wait, db, failed_patients_list, year, current_time_stamp):
+    return cache.ids_by_year()
+
+def remove_discharged_patient(db, cache, changes, row, patient_data, journal=None):
+    """
+    Deletes a patient who is no longer in care and releases their capacity slot.
+    With a RunJournal the removal is keyed "remove:<case number>" so an interrupted
+    removal is finished on resume without releasing the slot twice.
+    """
+    case_number = row.case_number
+    key = f"remove:{case_number}"
+    if journal is not None and journal.is_op_done(key):
+        return
+
+    # Check which collection the patient is in before deleting
+    removal = {
+        "was_in_care": cache.get("patients_in_care", case_number) is not None,
+        "species": patient_data.get("species", ""),
+        "age_stage": patient_data.get("age_stage", ""),
+        "intake_date": patient_data.get("intake_date", ""),
+        "disposition": row.disposition,
+    }
+    if journal is not None:
+        removal = journal.op_begin(key, removal)
+    was_in_care, species = removal["was_in_care"], removal["species"]
+
+    delete_patient(db, cache, "patients_in_care", case_number)
+    delete_patient(db, cache, "other_patients", case_number)
+
+    # Only update capacity if patient was in patients_in_care
+    if was_in_care and species and (journal is None or not journal.has_step(key, "capacity")):
+        update_capacity_count(db, species, removal["age_stage"], delta=-1,
+                              op_id=journal.op_id(key) if journal is not None else None)
+        if journal is not None:
+            journal.op_step(key, "capacity")
+    changes.record_remove("patients_in_care" if was_in_care else "other_patients", case_number,
+                          removal, removal["disposition"])
+    if journal is not None:
+        journal.op_done(key)
+    print(f"❌ Removed patient: {case_number}")
+
+def resume_pending_ops(db, cache, changes, journal):
+    """
+    Completes the per-patient operations an interrupted run started but did not finish.
+    """
+    for key, op in journal.pending_ops().items():
+        kind, _, case_number = key.partition(":")
+        payload = op["payload"]
+        print(f"📓 Finishing interrupted {kind} of {case_number}")
+        if kind == "add":
+            record = PatientRecord.from_firestore(payload["collection"], payload["data"])
+            add_new_patient(db, cache, record, journal, changes)
+        elif kind == "remove":
+            row = ScrapedRow(case_number, payload["species"], payload["disposition"], None, 0)
+            remove_discharged_patient(db, cache, changes, row, payload, journal)
+
+def recheck_failed_patient(db, cache, changes, failed, age_stage_raw, page_num, last_checked, journal=None):
+    """
+    Re-evaluates a failed_patients record with a freshly read age stage.
+    Moves it to patients_in_care/other_patients when the age is now valid and returns True;
+    otherwise stores the latest raw age (skipped if unchanged) and returns False.
+    """
+    matched_age = match_age_stage(age_stage_raw if age_stage_raw else "")
+    if matched_age is None:
+        failed.raw_age = age_stage_raw if age_stage_raw else ""
+        failed.last_checked = last_checked
+        if write_record(db, cache, failed):
+            changes.record_update(failed)
+        print(f"⚠️ Patient {failed.patient_id} still has invalid age: {age_stage_raw}")
+        return False
+
+    species_raw = failed.wrmd_species or ""
+    if failed.species:
+        record = PatientRecord(collection="patients_in_care", patient_id=failed.patient_id, page_number=page_num,
+                               species=failed.species, wrmd_species=species_raw, age_stage=matched_age,
+                               intake_date=failed.intake_date, last_checked=last_checked)
+    else:
+        record = PatientRecord(collection="other_patients", patient_id=failed.patient_id, page_number=page_num,
+                               species=species_raw, age_stage=matched_age,
+                               intake_date=failed.intake_date, last_checked=last_checked)
+    add_new_patient(db, cache, record, journal)
+    delete_patient(db, cache, "failed_patients", failed.patient_id)
+    changes.record_move("failed_patients", record)
+    print(f"✅ Moved patient {failed.patient_id} from failed_patients to {record.collection}")
+    return True
+
+def record_detail_failure(db, cache, changes, row, reason, last_checked):
+    """
+    Stores a new patient whose detail page could not be read in failed_patients so the next run retries it.
+    """
+    record = PatientRecord(
+        collection="failed_patients",
+        patient_id=row.case_number,
+        page_number=row.page_number,
+        species=match_species_name(row.species),
+        wrmd_species=row.species,
+        raw_age="unknown",
+        intake_date=row.intake_date,
+        last_checked=last_checked,
+        reason=reason
+    )
+    write_record(db, cache, record)
+    changes.record_add(record)
+
+def check_failed_patients(nav, db, cache, changes, failed_patients_list, year, current_time_stamp, journal=None):
     """
     Check failed patients to see if they now have valid age stages.
     If valid, move them to patients_in_care or other_patients.
+    Pages the journal already marks as done are skipped.
     Returns a set of patient IDs that were processed (moved or removed).
     """
     processed_patients = set()
@@ -59,186 +171,82 @@ def check_failed_patients(driver, wait, db, failed_patients_list, year, current_
     # Group failed patients by page
     failed_by_page = {}
     for wid in failed_patients_list:
-        doc = db.collection("failed_patients").document(wid).get()
-        if doc.exists:
-            data = doc.to_dict()
+        data = cache.get("failed_patients", wid)
+        if data is not None:
             page_num = data.get("page_number", 1)
-            if page_num not in failed_by_page:
-                failed_by_page[page_num] = []
-            failed_by_page[page_num].append((wid, data))
+            failed_by_page.setdefault(page_num, {})[wid] = data
     
     # Check each failed patient
     for page_num in sorted(failed_by_page.keys()):
+        if journal is not None and journal.is_page_done(year, "failed", page_num):
+            print(f"📓 Page {page_num} already checked for failed patients")
+            continue
         print(f"📄 Checking page {page_num} for failed patients...")
         url = f"{PATIENT_LIST_URL}?change_year_to={year}&page={page_num}"
-        driver.get(url)
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'table.table')))
+        try:
+            nav.load(url, timeout=list_page_timeout(nav, page_num))
+        except NavigationError as e:
+            print(f"   ❌ Skipping page {page_num}: {e}")
+            continue
         # Wait longer for all rows to load
         time.sleep(5)
         
         # Additional wait to ensure dynamic content is loaded
-        try:
-            wait.until(lambda d: len(d.find_elements(By.CSS_SELECTOR, "table.table tbody tr")) > 0)
-        except:
-            print(f"⚠️ No rows found on page {page_num}, waiting longer...")
-            time.sleep(3)
-        
-        rows = driver.find_elements(By.CSS_SELECTOR, "table.table tbody tr")
-        for i, row in enumerate(rows):
-            try:
-                # Re-find the row to avoid stale element reference
-                current_rows = driver.find_elements(By.CSS_SELECTOR, "table.table tbody tr")
-                if i >= len(current_rows):
-                    break
-                row = current_rows[i]
-                cells = row.find_elements(By.TAG_NAME, "td")
-            except (InvalidSessionIdException, NoSuchWindowException, StaleElementReferenceException) as e:
-                print(f"⚠️ Error while processing row {i}: {e}")
-                print("   Attempting to recover...")
-                # Try to switch back to main window if possible
-                try:
-                    if driver.window_handles:
-                        driver.switch_to.window(driver.window_handles[0])
-                    continue
-                except:
-                    print("   ❌ Failed to recover session. Skipping remaining rows.")
-                    break
-            if len(cells) < 8:
-                continue
-            case_number = cells[1].text.strip()
+        nav.wait_for_rows(timeout=30)
+        # Detail pages open in this tab, so read the whole list before visiting any of them
+        for row, href in snapshot_rows(nav.driver, page_num):
+            case_number = row.case_number
             
             # Check if this is one of our failed patients
-            if case_number in [p[0] for p in failed_by_page[page_num]]:
-                patient_data = next(p[1] for p in failed_by_page[page_num] if p[0] == case_number)
-                species_raw = patient_data.get("wrmd_species", "")
-                matched_species = patient_data.get("species", "")
+            if case_number in failed_by_page[page_num]:
+                failed = PatientRecord.from_firestore("failed_patients", failed_by_page[page_num][case_number])
                 
                 # First check disposition - if not pending, remove from failed_patients
-                disposition = cells[4].text.strip().lower() if len(cells) > 4 else ""
-                
-                if ("died" in disposition or "euthanized" in disposition or "released" in disposition or
-                    "dead" in disposition or "transferred" in disposition or "void" in disposition):
+                if row.is_closed:
                     # Patient is no longer pending, remove from failed_patients
-                    db.collection("failed_patients").document(case_number).delete()
+                    delete_patient(db, cache, "failed_patients", case_number)
+                    changes.record_remove("failed_patients", case_number, failed_by_page[page_num][case_number], row.disposition)
                     processed_patients.add(case_number)
-                    print(f"❌ Removed failed patient {case_number} - disposition: {disposition}")
+                    print(f"❌ Removed failed patient {case_number} - disposition: {row.disposition}")
                     continue
                 
                 # Only check age stage if disposition is still pending
-                if disposition != "pending":
-                    print(f"⚠️ Skipping failed patient {case_number} - unexpected disposition: {disposition}")
+                if not row.is_pending:
+                    print(f"⚠️ Skipping failed patient {case_number} - unexpected disposition: {row.disposition}")
                     continue
                 
                 # Open detail page to check age stage
                 try:
-                    # Store the main window handle
-                    main_window = driver.current_window_handle
-                    original_windows = driver.window_handles.copy()
-                    
-                    link = cells[2].find_element(By.TAG_NAME, "a")
-                    
-                    # Scroll to element and ensure it's visible
-                    driver.execute_script("arguments[0].scrollIntoView(true);", link)
-                    time.sleep(0.5)
-                    
-                    # Use platform-specific key combinations
-                    if platform.system() == 'Darwin':  # Mac
-                        link.send_keys(Keys.COMMAND + Keys.RETURN)
-                    else:  # Linux/Windows
-                        link.send_keys(Keys.CONTROL + Keys.RETURN)
-                    
-                    # Wait longer and retry if needed
-                    max_retries = 3
-                    for retry in range(max_retries):
-                        time.sleep(2 + retry)  # Progressive wait: 2s, 3s, 4s
-                        new_windows = [w for w in driver.window_handles if w not in original_windows]
-                        if new_windows:
-                            break
-                        if retry < max_retries - 1:
-                            print(f"⚠️ Retry {retry + 1}: Waiting for new tab for patient {case_number}")
-                    
-                    if not new_windows:
-                        print(f"⚠️ Failed to open new tab for patient {case_number} after {max_retries} attempts")
-                        continue
-                    
-                    driver.switch_to.window(new_windows[0])
-                    
-                    age_stage_raw = None
-                    try:
-                        initial_care_link = driver.find_element(By.PARTIAL_LINK_TEXT, "Initial Care")
-                        driver.execute_script("arguments[0].scrollIntoView(true);", initial_care_link)
-                        time.sleep(1)
-                        driver.execute_script("arguments[0].click();", initial_care_link)
-                        time.sleep(2)
-                    except Exception as e:
-                        print(f"⚠️ Failed to click 'Initial Care': {e}")
-                    
                     try:
-                        wait.until(EC.presence_of_element_located((By.NAME, "exams[age_unit]")))
-                        age_stage_select = driver.find_element(By.NAME, "exams[age_unit]")
-                        age_stage_raw = age_stage_select.find_element(By.CSS_SELECTOR, "option:checked").text.strip()
-                    except Exception as e:
-                        print(f"⚠️ Failed to extract age stage: {e}")
-                    
-                    # Close the tab and switch back
-                    driver.close()
-                    driver.switch_to.window(main_window)
-                    
-                    # Check if age is now valid
-                    matched_age = match_age_stage(age_stage_raw if age_stage_raw else "")
+                        age_stage_raw = read_age_stage(nav, href)
+                    except NavigationError as e:
+                        print(f"⚠️ Failed to open detail page for patient {case_number}: {e}")
+                        continue
                     
-                    if matched_age is not None:
-                        # Move to appropriate collection
-                        if matched_species:
-                            # Move to patients_in_care
-                            db.collection("patients_in_care").document(case_number).set({
-                                "page_number": page_num,
-                                "patient_id": case_number,
-                                "species": matched_species,
-                                "wrmd_species": species_raw,
-                                "age_stage": matched_age,
-                                "status": "Pending",
-                                "intake_date": patient_data.get("intake_date", ""),
-                                "last_checked": current_time_stamp
-                            })
-                            update_capacity_count(db, matched_species, matched_age, delta=1)
-                            log_message(db, page_num, case_number, matched_species, matched_age, action="add", success=True)
-                            processed_patients.add(case_number)
-                            print(f"✅ Moved patient {case_number} from failed_patients to patients_in_care")
-                        else:
-                            # Move to other_patients
-                            db.collection("other_patients").document(case_number).set({
-                                "page_number": page_num,
-                                "patient_id": case_number,
-                                "species": species_raw,
-                                "age_stage": matched_age,
-                                "status": "Pending",
-                                "intake_date": patient_data.get("intake_date", ""),
-                                "last_checked": current_time_stamp
-                            })
-                            log_message(db, page_num, case_number, species_raw, matched_age, action="add", success=True)
-                            processed_patients.add(case_number)
-                            print(f"✅ Moved patient {case_number} from failed_patients to other_patients")
-                        
-                        # Delete from failed_patients
-                        db.collection("failed_patients").document(case_number).delete()
-                    else:
-                        # Age still invalid, just update last_checked
-                        db.collection("failed_patients").document(case_number).update({
-                            "last_checked": current_time_stamp,
-                            "raw_age": age_stage_raw if age_stage_raw else ""
-                        })
-                        print(f"⚠️ Patient {case_number} still has invalid age: {age_stage_raw}")
+                    if recheck_failed_patient(db, cache, changes, failed, age_stage_raw, page_num, current_time_stamp, journal):
+                        processed_patients.add(case_number)
                         
+                except CircuitOpenError:
+                    raise
                 except Exception as e:
                     print(f"⚠️ Failed to check failed patient {case_number}: {e}")
 
+        if journal is not None:
+            journal.page_done(year, "failed", page_num)
+
     return processed_patients
 
-def check_and_update_dispositions(driver, wait, db, wrmd_ids_by_year, failed_patients_by_year):
-    # Use consistent timestamp format with UTC-7 timezone
-    pacific_tz = timezone(timedelta(hours=-7))
-    current_time_stamp = datetime.now(timezone.utc).astimezone(pacific_tz).strftime("%B %d, %Y at %I:%M:%S %p UTC-7")
+def time_to_first_page(browser):
+    """
+    Seconds from process start until the first WRMD list page finished loading, or None.
+    """
+    if browser.first_page_at is None:
+        return None
+    return round(browser.first_page_at - PROCESS_STARTED, 2)
+
+def check_and_update_dispositions(nav, db, cache, changes, wrmd_ids_by_year, failed_patients_by_year, journal=None):
+    # One timestamp for every document written in this run
+    current_time_stamp = format_timestamp(pacific_now())
 
     for year_prefix, wrmd_ids_list in wrmd_ids_by_year.items():
         year = "20" + year_prefix
@@ -247,91 +255,44 @@ def check_and_update_dispositions(driver, wait, db, wrmd_ids_by_year, failed_pat
         # Group wrmd_ids by their page numbers from the database
         patients_by_page = {}
         for wid in wrmd_ids_list:
-            # Get the page number from the database
-            doc = db.collection("patients_in_care").document(wid).get()
-            if not doc.exists:
-                doc = db.collection("other_patients").document(wid).get()
-            if doc.exists:
-                data = doc.to_dict()
+            # Get the page number from the local cache
+            _, data = cache.find(wid, ("patients_in_care", "other_patients"))
+            if data is not None:
                 page_num = data.get("page_number", 1)
-                if page_num not in patients_by_page:
-                    patients_by_page[page_num] = []
-                patients_by_page[page_num].append((wid, data))
+                patients_by_page.setdefault(page_num, {})[wid] = data
 
         checked_ids = set()
         max_page_checked = 0
 
         # First, check existing patients by directly going to their pages
         for page_num in sorted(patients_by_page.keys()):
+            if journal is not None and journal.is_page_done(year, "existing", page_num):
+                print(f"📓 Page {page_num} already checked for existing patients")
+                checked_ids.update(patients_by_page[page_num])
+                max_page_checked = max(max_page_checked, page_num)
+                continue
             print(f"📄 Checking page {page_num} for existing patients...")
             url = f"{PATIENT_LIST_URL}?change_year_to={year}&page={page_num}"
             
-            # Retry logic for page loading
-            max_retries = 3
-            retry_count = 0
-            page_loaded = False
-            
-            while retry_count < max_retries and not page_loaded:
-                try:
-                    driver.get(url)
-                    # Wait for table with increased timeout for problematic pages
-                    timeout = 60 if page_num >= 15 else 30
-                    WebDriverWait(driver, timeout).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, 'table.table'))
-                    )
-                    page_loaded = True
-                except Exception as e:
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        print(f"   ⚠️ Page {page_num} failed to load (attempt {retry_count}/{max_retries}). Retrying...")
-                        print(f"      Current URL: {driver.current_url}")
-                        print(f"      Error: {str(e)[:200]}")
-                        
-                        # Check page source for debugging
-                        try:
-                            page_source = driver.page_source[:500]
-                            if "sign in" in page_source.lower() or "login" in page_source.lower():
-                                print("      ⚠️ Possible session timeout - may need to re-login")
-                            elif "error" in page_source.lower():
-                                print("      ⚠️ Page contains error message")
-                        except:
-                            pass
-                            
-                        time.sleep(5)
-                        # Try refreshing the page
-                        try:
-                            driver.refresh()
-                            time.sleep(3)
-                        except:
-                            pass
-                    else:
-                        print(f"   ❌ Failed to load page {page_num} after {max_retries} attempts.")
-                        print(f"      Final error: {str(e)}")
-                        print(f"   Skipping page {page_num}...")
-                        continue
-            
-            if not page_loaded:
+            try:
+                # The rate controller sizes the timeout from recent list load times
+                nav.load(url, timeout=list_page_timeout(nav, page_num))
+            except NavigationError as e:
+                print(f"   ❌ Failed to load page {page_num}: {e}")
+                print(f"   Skipping page {page_num}...")
                 continue
                 
             # Scroll to bottom to trigger any lazy loading
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+            nav.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
             time.sleep(2)
             
             # Scroll back up
-            driver.execute_script("window.scrollTo(0, 0);")
+            nav.driver.execute_script("window.scrollTo(0, 0);")
             time.sleep(3)
             
             # Wait for rows to load
-            try:
-                WebDriverWait(driver, 10).until(
-                    lambda d: len(d.find_elements(By.CSS_SELECTOR, "table.table tbody tr")) > 0
-                )
-            except:
-                print(f"⚠️ No rows found on page {page_num}, waiting longer...")
-                time.sleep(3)
-
-            rows = driver.find_elements(By.CSS_SELECTOR, "table.table tbody tr")
-            expected_patients = [p[0] for p in patients_by_page[page_num]]
+            rows = nav.wait_for_rows()
+            expected_patients = list(patients_by_page[page_num])
             print(f"   Found {len(rows)} rows on page {page_num} (expecting {len(expected_patients)} specific patients)")
             
             # Debug: print all case numbers found on this page
@@ -353,7 +314,7 @@ def check_and_update_dispositions(driver, wait, db, wrmd_ids_by_year, failed_pat
             for i, row in enumerate(rows):
                 try:
                     # Re-find the row to avoid stale element reference
-                    current_rows = driver.find_elements(By.CSS_SELECTOR, "table.table tbody tr")
+                    current_rows = nav.driver.find_elements(By.CSS_SELECTOR, "table.table tbody tr")
                     if i >= len(current_rows):
                         break
                     row = current_rows[i]
@@ -362,285 +323,244 @@ def check_and_update_dispositions(driver, wait, db, wrmd_ids_by_year, failed_pat
                     print(f"⚠️ Session error while processing row {i}: {e}")
                     print("   Attempting to recover...")
                     try:
-                        if driver.window_handles:
-                            driver.switch_to.window(driver.window_handles[0])
+                        if nav.driver.window_handles:
+                            nav.driver.switch_to.window(nav.driver.window_handles[0])
                         continue
                     except:
                         print("   ❌ Failed to recover session. Skipping remaining rows.")
                         break
                 if len(cells) < 8:
                     continue
-                case_number = cells[1].text.strip()
-                disposition = cells[4].text.strip().lower()
+                row = ScrapedRow.from_cells(cells, page_num)
+                case_number = row.case_number
 
-                if case_number in [p[0] for p in patients_by_page[page_num]]:
+                if case_number in patients_by_page[page_num]:
                     checked_ids.add(case_number)
-                    patient_data = next(p[1] for p in patients_by_page[page_num] if p[0] == case_number)
-                    species = patient_data.get("species", "")
-                    age_stage = patient_data.get("age_stage", "")
-
-                    if ("died" in disposition or "euthanized" in disposition or "released" in disposition or
-                        "dead" in disposition or "transferred" in disposition or "void" in disposition):
-                        # Check which collection the patient is in before deleting
-                        was_in_care = db.collection("patients_in_care").document(case_number).get().exists
-                        
-                        db.collection("patients_in_care").document(case_number).delete()
-                        db.collection("other_patients").document(case_number).delete()
-                        
-                        # Only update capacity if patient was in patients_in_care
-                        if was_in_care and species:
-                            update_capacity_count(db, species, age_stage, delta=-1)
-                        print(f"❌ Removed patient: {case_number}")
+                    patient_data = patients_by_page[page_num][case_number]
+
+                    if row.is_closed:
+                        remove_discharged_patient(db, cache, changes, row, patient_data, journal)
                     else:
                         print(f"🔁 Patient still pending: {case_number}")
             
             max_page_checked = max(max_page_checked, page_num)
+            if journal is not None:
+                journal.page_done(year, "existing", page_num)
 
         # Check failed patients if any exist for this year
         if year_prefix in failed_patients_by_year:
-            processed_failed_patients = check_failed_patients(driver, wait, db, failed_patients_by_year[year_prefix], year, current_time_stamp)
+            processed_failed_patients = check_failed_patients(nav, db, cache, changes, failed_patients_by_year[year_prefix], year, current_time_stamp, journal)
             # Add processed failed patients to checked_ids to prevent double counting
             checked_ids.update(processed_failed_patients)
+            # Failed patients that are still pending belong to the failed pass above, not to
+            # the new-patient pass below (a failed-only year starts that pass at page 1)
+            checked_ids.update(failed_patients_by_year[year_prefix])
+
+        # A page of this year must be showing before the pagination can be read; after a resume
+        # or the failed-patient pass the browser may be elsewhere
+        first_page = max(max_page_checked, 1)
+        first_url = f"{PATIENT_LIST_URL}?change_year_to={year}&page={first_page}"
+        if nav.last_url != first_url:
+            try:
+                nav.load(first_url)
+            except NavigationError as e:
+                print(f"   ❌ Failed to load page {first_page}, skipping new patients for {year}: {e}")
+                continue
+            nav.wait_for_rows(timeout=30)
 
         # Get total pages to check for new patients
-        pagination_links = driver.find_elements(By.CSS_SELECTOR, 'ul.pagination li a[href^="#"]')
+        pagination_links = nav.driver.find_elements(By.CSS_SELECTOR, 'ul.pagination li a[href^="#"]')
         page_numbers = [int(p.text) for p in pagination_links if p.text.strip().isdigit()]
         total_pages = max(page_numbers) if page_numbers else 1
         print(f"Total pages in year {year}: {total_pages}")
 
         # Now check for new patients starting from the last checked page
-        print(f"🔍 Checking for new patients from page {max_page_checked} to {total_pages}...")
-        for page in range(max_page_checked, total_pages + 1):
-            if page != max_page_checked:
-                url = f"{PATIENT_LIST_URL}?change_year_to={year}&page={page}"
-                driver.get(url)
-                wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'table.table')))
+        print(f"🔍 Checking for new patients from page {first_page} to {total_pages}...")
+        for page in range(first_page, total_pages + 1):
+            if journal is not None and journal.is_page_done(year, "new", page):
+                print(f"📓 Page {page} already checked for new patients")
+                continue
+            url = f"{PATIENT_LIST_URL}?change_year_to={year}&page={page}"
+            if nav.last_url != url:
+                try:
+                    nav.load(url, timeout=list_page_timeout(nav, page))
+                except NavigationError as e:
+                    print(f"   ❌ Skipping page {page}: {e}")
+                    continue
                 # Wait longer for all rows to load
                 time.sleep(5)
                 
                 # Additional wait to ensure dynamic content is loaded
-                try:
-                    wait.until(lambda d: len(d.find_elements(By.CSS_SELECTOR, "table.table tbody tr")) > 0)
-                except:
-                    print(f"⚠️ No rows found on page {page}, waiting longer...")
-                    time.sleep(3)
+                nav.wait_for_rows(timeout=30)
 
-            rows = driver.find_elements(By.CSS_SELECTOR, "table.table tbody tr")
+            # Detail pages open in this tab, so read the whole list before visiting any of them
+            rows = snapshot_rows(nav.driver, page)
             print(f"   Found {len(rows)} rows on page {page}")
             
-            for i, row in enumerate(rows):
-                try:
-                    # Re-find the row to avoid stale element reference
-                    current_rows = driver.find_elements(By.CSS_SELECTOR, "table.table tbody tr")
-                    if i >= len(current_rows):
-                        break
-                    row = current_rows[i]
-                    cells = row.find_elements(By.TAG_NAME, "td")
-                except (InvalidSessionIdException, NoSuchWindowException, StaleElementReferenceException) as e:
-                    print(f"⚠️ Session error while processing row {i}: {e}")
-                    print("   Attempting to recover...")
-                    try:
-                        if driver.window_handles:
-                            driver.switch_to.window(driver.window_handles[0])
-                        continue
-                    except:
-                        print("   ❌ Failed to recover session. Skipping remaining rows.")
-                        break
-                if len(cells) < 8:
-                    continue
-                case_number = cells[1].text.strip()
-                disposition = cells[4].text.strip().lower()
-                admit_date_str = cells[8].text.strip()
+            for row, href in rows:
+                case_number = row.case_number
 
-                try:
-                    admit_date = datetime.strptime(admit_date_str, "%m/%d/%Y")
-                except ValueError:
-                    print(f"⚠️ Skipping row {case_number} due to invalid date: {admit_date_str}")
+                if row.date_admitted is None:
+                    print(f"⚠️ Skipping row {case_number} due to invalid admission date")
                     continue
 
                 # Check for new pending patients
-                if disposition == "pending" and case_number not in checked_ids and case_number not in wrmd_ids_list:
+                if row.is_pending and case_number not in checked_ids and case_number not in wrmd_ids_list:
                     # Treat as new patient
-                    species_raw = cells[2].text.strip()
-                    age_stage_raw = None
-
                     try:
-                        # Store the main window handle
-                        main_window = driver.current_window_handle
-                        original_windows = driver.window_handles.copy()
-                        
-                        link = cells[2].find_element(By.TAG_NAME, "a")
-                        
-                        # Scroll to element and ensure it's visible
-                        driver.execute_script("arguments[0].scrollIntoView(true);", link)
-                        time.sleep(0.5)
-                        
-                        # Use platform-specific key combinations
-                        if platform.system() == 'Darwin':  # Mac
-                            link.send_keys(Keys.COMMAND + Keys.RETURN)
-                        else:  # Linux/Windows
-                            link.send_keys(Keys.CONTROL + Keys.RETURN)
-                        
-                        # Wait longer and retry if needed
-                        max_retries = 3
-                        for retry in range(max_retries):
-                            time.sleep(2 + retry)  # Progressive wait: 2s, 3s, 4s
-                            new_windows = [w for w in driver.window_handles if w not in original_windows]
-                            if new_windows:
-                                break
-                            if retry < max_retries - 1:
-                                print(f"⚠️ Retry {retry + 1}: Waiting for new tab for patient {case_number}")
-                        
-                        if not new_windows:
-                            print(f"⚠️ Failed to open new tab for patient {case_number} after {max_retries} attempts")
-                            # Add to failed_patients collection to retry in next run
-                            matched_species = match_species_name(species_raw)
-                            db.collection("failed_patients").document(case_number).set({
-                                "page_number": page,
-                                "patient_id": case_number,
-                                "species": matched_species,
-                                "wrmd_species": species_raw,
-                                "raw_age": "unknown",
-                                "status": "Pending",
-                                "intake_date": admit_date.strftime("%B %d, %Y"),
-                                "last_checked": current_time_stamp,
-                                "reason": "failed_to_open_tab"
-                            })
-                            print(f"📝 Added to failed_patients (tab opening failed): {case_number}")
-                            continue
-                        
-                        driver.switch_to.window(new_windows[0])
-
-                        try:
-                            initial_care_link = driver.find_element(By.PARTIAL_LINK_TEXT, "Initial Care")
-                            driver.execute_script("arguments[0].scrollIntoView(true);", initial_care_link)
-                            time.sleep(1)
-                            driver.execute_script("arguments[0].click();", initial_care_link)
-                            time.sleep(2)
-                        except Exception as e:
-                            print(f"⚠️ Failed to click 'Initial Care': {e}")
-
-                        try:
-                            wait.until(EC.presence_of_element_located((By.NAME, "exams[age_unit]")))
-                            age_stage_select = driver.find_element(By.NAME, "exams[age_unit]")
-                            age_stage_raw = age_stage_select.find_element(By.CSS_SELECTOR, "option:checked").text.strip()
-                        except Exception as e:
-                            print(f"⚠️ Failed to extract age stage: {e}")
-
-                        # Close the tab and switch back
-                        driver.close()
-                        driver.switch_to.window(main_window)
+                        age_stage_raw = read_age_stage(nav, href)
+
+                    except NavigationError as e:
+                        print(f"⚠️ Failed to open detail page for patient {case_number}: {e}")
+                        # Add to failed_patients collection to retry in next run
+                        record_detail_failure(db, cache, changes, row, "failed_to_open_detail", current_time_stamp)
+                        print(f"📝 Added to failed_patients (detail page failed to load): {case_number}")
+                        continue
 
+                    except CircuitOpenError:
+                        raise
                     except Exception as e:
                         print(f"⚠️ Failed to open patient detail page: {e}")
                         # Add to failed_patients collection to retry in next run
-                        matched_species = match_species_name(species_raw)
-                        db.collection("failed_patients").document(case_number).set({
-                            "page_number": page,
-                            "patient_id": case_number,
-                            "species": matched_species,
-                            "wrmd_species": species_raw,
-                            "raw_age": "unknown",
-                            "status": "Pending",
-                            "intake_date": admit_date.strftime("%B %d, %Y"),
-                            "last_checked": current_time_stamp,
-                            "reason": f"page_access_error: {str(e)}"
-                        })
+                        record_detail_failure(db, cache, changes, row, f"page_access_error: {str(e)}", current_time_stamp)
                         print(f"📝 Added to failed_patients (page access error): {case_number}")
                         continue
 
-                    matched_species = match_species_name(species_raw)
-                    matched_age = match_age_stage(age_stage_raw if age_stage_raw else "")
-
-                    if matched_species is not None:
-                        if matched_age is not None:
-                            doc_ref = db.collection("patients_in_care").document(case_number)
-                            doc_ref.set({
-                                "page_number": page,
-                                "patient_id": case_number,
-                                "species": matched_species,
-                                "wrmd_species": species_raw,
-                                "age_stage": matched_age,
-                                "status": "Pending",
-                                "intake_date": admit_date.strftime("%B %d, %Y"),
-                                "last_checked": current_time_stamp
-                            })
-                            update_capacity_count(db, matched_species, matched_age, delta=1)
-                            log_message(db, page, case_number, matched_species, matched_age, action="add", success=True)
-                            print(f"➕ Added new patient: {case_number}")
-                        else:
-                            # Add to failed_patients collection
-                            db.collection("failed_patients").document(case_number).set({
-                                "page_number": page,
-                                "patient_id": case_number,
-                                "species": matched_species,
-                                "wrmd_species": species_raw,
-                                "raw_age": age_stage_raw if age_stage_raw else "",
-                                "status": "Pending",
-                                "intake_date": admit_date.strftime("%B %d, %Y"),
-                                "last_checked": current_time_stamp
-                            })
-                            log_message(db, page, case_number, matched_species, age_stage_raw, action="add", success=False)
-                            print(f"⚠️ Added to failed_patients (invalid age): {case_number}")
+                    record = classify_patient(replace(row, age_stage=age_stage_raw), current_time_stamp)
+                    if not add_new_patient(db, cache, record, journal, changes):
+                        continue
+                    if record.collection == "patients_in_care":
+                        print(f"➕ Added new patient: {case_number}")
+                    elif record.collection == "failed_patients":
+                        print(f"⚠️ Added to failed_patients (invalid age): {case_number}")
                     else:
-                        db.collection("other_patients").document(case_number).set({
-                            "page_number": page,
-                            "patient_id": case_number,
-                            "species": species_raw,
-                            "age_stage": age_stage_raw,
-                            "status": "Pending",
-                            "intake_date": admit_date.strftime("%B %d, %Y"),
-                            "last_checked": current_time_stamp
-                        })
-                        log_message(db, page, case_number, species_raw, age_stage_raw, action="add", success=True)
                         print(f"✅ Added to other_patients: {case_number}")
 
+            if journal is not None:
+                journal.page_done(year, "new", page)
+
         # Report any patients that weren't found
         remaining = set(wrmd_ids_list) - checked_ids
         for missing in remaining:
             print(f"⚠️ Patient {missing} not found on expected page - may have been deleted from WRMD")
 
-def main():
-    # Initialize Firestore
-    db = initialize_firestore()
-    
+def main(fix_capacity=False):
+    # Launch Chrome and log in on a worker thread while Firestore and the local cache come up
+    browser = DriverManager(headless=True)
+    browser_ready = browser.start_in_background()
+    cache = LocalCache()
+    changes = RunChanges()
+    startup = {"imports_s": round(IMPORTS_DONE - PROCESS_STARTED, 2)}
+    db = None
+    journal = None
+
     # Record the start time
-    start_time = datetime.now(timezone(timedelta(hours=-7)))
+    start_time = pacific_now()
     
     try:
-        # Launch Selenium driver
-        driver, wait = launch_wrmd_driver(headless=True)
-        login_to_wrmd(driver, wait)
-
-        # Get all patients currently in care (including failed patients)
-        wrmd_ids_by_year, failed_patients_by_year = get_wid_in_care(db)
+        db = initialize_firestore()
+        startup["firestore_s"] = round(time.perf_counter() - PROCESS_STARTED, 2)
+
+        # Walk the active years every run and dormant years with stragglers on a slower cadence
+        years, dormant = select_years(db, cache.year_prefixes(), start_time.year)
+        # Bring the local mirror of those years up to date; a rebuild may turn up more years
+        if cache.reconcile(db, years) == "rebuilt":
+            years, dormant = select_years(db, cache.year_prefixes(), start_time.year)
+        startup["cache_s"] = round(time.perf_counter() - PROCESS_STARTED, 2)
+
+        # Pick up an interrupted run where it stopped
+        journal = RunJournal(db)
+        journal.start(start_time.isoformat(timespec="seconds"))
+        changes.attach(journal)
+        resume_pending_ops(db, cache, changes, journal)
+        wrmd_ids_by_year, failed_patients_by_year = get_wid_in_care(cache)
+        if dormant:
+            print(f"💤 Skipping dormant years this run: {', '.join('20' + y for y in dormant)}")
+        wrmd_ids_by_year = {y: wrmd_ids_by_year.get(y, []) for y in years}
+        failed_patients_by_year = {y: ids for y, ids in failed_patients_by_year.items() if y in years}
+
+        nav = browser_ready.result()
+        startup["browser_s"] = round(time.perf_counter() - PROCESS_STARTED, 2)
+        print(f"⏱️ Startup: {startup}")
 
         # Check WRMD and update statuses, including adding new patients and checking failed patients
-        check_and_update_dispositions(driver, wait, db, wrmd_ids_by_year, failed_patients_by_year)
+        check_and_update_dispositions(nav, db, cache, changes, wrmd_ids_by_year, failed_patients_by_year, journal)
+        mark_years_checked(db, years)
 
-        driver.quit()
+        browser.quit()
+        startup["first_page_s"] = time_to_first_page(browser)
+        print(f"🧭 Browser watermarks: {browser.summary()}")
+        print(f"⏱️ Time to first page: {startup['first_page_s']}s")
         
         # Record successful completion
         db.collection("system").document("last_update").set({
             "timestamp": start_time.strftime("%B %d, %Y at %I:%M:%S %p"),
             "status": "success",
-            "updated_at": start_time
+            "updated_at": start_time,
+            "browser": browser.summary(),
+            "startup": startup,
+            "resumed": journal.resumed,
+            "years_checked": ["20" + y for y in years],
+            "years_skipped": ["20" + y for y in dormant]
         })
+        journal.finish()
         
         print("✅ All patients updated.")
+
+        # Counters only move by deltas; check them against the patients actually in care
+        try:
+            audit_capacity(db, fix=fix_capacity)
+        except Exception as e:
+            print(f"⚠️ Capacity audit failed: {e}")
         
     except Exception as e:
-        # Record failure
-        db.collection("system").document("last_update").set({
-            "timestamp": start_time.strftime("%B %d, %Y at %I:%M:%S %p"),
-            "status": "failed",
-            "error": str(e),
-            "updated_at": start_time
-        })
+        # Record failure; the unfinished journal lets the next run resume
+        if journal is not None:
+            journal.interrupt(e)
+        if db is not None:
+            startup["first_page_s"] = time_to_first_page(browser)
+            db.collection("system").document("last_update").set({
+                "timestamp": start_time.strftime("%B %d, %Y at %I:%M:%S %p"),
+                "status": "failed",
+                "error": str(e),
+                "updated_at": start_time,
+                "browser": browser.summary(),
+                "startup": startup
+            })
         
         print(f"❌ Update failed: {e}")
         # Re-raise the exception
         raise e
 
+    finally:
+        browser.quit()
+        if db is not None:
+            # Fold whatever this run changed into today's rollup, even if it ended early
+            published = True
+            try:
+                write_daily_rollup(db, changes, cache.occupancy(), start_time)
+            except Exception as e:
+                published = False
+                print(f"⚠️ Failed to write daily rollup: {e}")
+            # Publish the run's deltas for dashboard clients
+            try:
+                publish_changes(db, changes, start_time)
+            except Exception as e:
+                published = False
+                print(f"⚠️ Failed to publish change feed: {e}")
+            # Otherwise the journaled changes are carried into the next run
+            if journal is not None:
+                if published:
+                    journal.changes_published()
+                journal.close()
+        cache.close()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Sync WRMD patient dispositions into Firestore.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Sample the run and write a collapsed-stack profile and summary under runs/")
+    parser.add_argument("--fix-capacity", action="store_true",
+                        help="Correct number_in_care counters that the post-sync audit finds drifted")
+    args = parser.parse_args()
+    with profile_run("update_patients", enabled=args.profile):
+        main(fix_capacity=args.fix_capacity)
\ No newline at end of file
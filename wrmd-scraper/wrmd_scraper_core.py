@@ -1,4 +1,5 @@
 from selenium import webdriver
+from selenium.common.exceptions import SessionNotCreatedException
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
@@ -6,11 +7,13 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select
-from webdriver_manager.chrome import ChromeDriverManager
+import json
+import re
 import time
-from datetime import datetime, timezone
 import os
-from dotenv import load_dotenv
+from dataclasses import replace
+from navigation import Navigator, NavigationError, CircuitOpenError
+from detail_extractor import read_age_stage, snapshot_rows
 
 
 # -------- CONFIG --------
@@ -18,10 +21,63 @@ WRMD_URL = "https://www.wrmd.org/"
 LOGIN_URL = WRMD_URL + "signin"
 PATIENT_LIST_URL = WRMD_URL + "lists"
 
-# WRMD credentials
-load_dotenv()
-WRMD_USERNAME = os.environ['WRMD_USERNAME']
-WRMD_PASSWORD = os.environ['WRMD_PASSWORD']
+# Resolved chromedriver (path and version) for local runs, so webdriver_manager's
+# version lookup only happens when the cached driver is missing, old or rejected by Chrome
+CHROMEDRIVER_CACHE = os.environ.get(
+    "WRMD_CHROMEDRIVER_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".chromedriver.json")
+)
+CHROMEDRIVER_MAX_AGE = 7 * 24 * 3600
+
+
+def wrmd_credentials():
+    """
+    Returns (username, password) from the environment, reading .env on first use.
+    """
+    if "WRMD_USERNAME" not in os.environ or "WRMD_PASSWORD" not in os.environ:
+        from dotenv import load_dotenv
+        load_dotenv()
+    return os.environ['WRMD_USERNAME'], os.environ['WRMD_PASSWORD']
+
+
+def _read_chromedriver_cache():
+    try:
+        with open(CHROMEDRIVER_CACHE) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(cached.get("path", "")):
+        return None
+    if time.time() - cached.get("resolved_at", 0) > CHROMEDRIVER_MAX_AGE:
+        return None
+    return cached
+
+
+def resolve_chromedriver(refresh=False):
+    """
+    Returns the chromedriver path for local runs.
+    The result of ChromeDriverManager().install() is kept in CHROMEDRIVER_CACHE and reused
+    for up to a week; refresh=True forces a new lookup (e.g. after a Chrome upgrade).
+    """
+    cached = None if refresh else _read_chromedriver_cache()
+    if cached is not None:
+        return cached["path"]
+
+    from webdriver_manager.chrome import ChromeDriverManager
+    path = ChromeDriverManager().install()
+    version = re.search(r"/(\d+(?:\.\d+)+)/", path)
+    try:
+        with open(CHROMEDRIVER_CACHE, "w") as f:
+            json.dump({
+                "path": path,
+                "version": version.group(1) if version else None,
+                "resolved_at": time.time(),
+            }, f)
+    except OSError as e:
+        print(f"⚠️ Could not cache chromedriver path: {e}")
+    print(f"Resolved ChromeDriver at: {path}")
+    return path
+
 
 def launch_wrmd_driver(headless=True):
     """
@@ -57,9 +113,13 @@ def launch_wrmd_driver(headless=True):
         service = Service(chromedriver_path)
         driver = webdriver.Chrome(service=service, options=options)
     else:
-        # Use ChromeDriverManager for local development
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=options)
+        # Use the cached ChromeDriverManager result for local development
+        try:
+            driver = webdriver.Chrome(service=Service(resolve_chromedriver()), options=options)
+        except SessionNotCreatedException as e:
+            # Usually a Chrome upgrade the cached driver does not support
+            print(f"⚠️ Cached ChromeDriver rejected ({str(e)[:120]}); resolving again")
+            driver = webdriver.Chrome(service=Service(resolve_chromedriver(refresh=True)), options=options)
     
     wait = WebDriverWait(driver, 30)  # Increased timeout for slower connections
     print("Chrome driver launched successfully")
@@ -67,10 +127,14 @@ def launch_wrmd_driver(headless=True):
     return driver, wait
 
 
-def login_to_wrmd(driver, wait, email=WRMD_USERNAME, password=WRMD_PASSWORD):
+def login_to_wrmd(driver, wait, email=None, password=None):
     """
-    Logs into the WRMD system using provided credentials.
+    Logs into the WRMD system using provided credentials (default: WRMD_USERNAME/WRMD_PASSWORD).
     """
+    if email is None or password is None:
+        default_email, default_password = wrmd_credentials()
+        email = email or default_email
+        password = password or default_password
     driver.get(LOGIN_URL)
 
     wait.until(EC.presence_of_element_located((By.ID, "email"))).send_keys(email)
@@ -83,20 +147,20 @@ def login_to_wrmd(driver, wait, email=WRMD_USERNAME, password=WRMD_PASSWORD):
     print("✅ Logged in to WRMD")
 
 
-def get_pending_patients(driver, wait, year):
+def iter_pending_patients(driver, wait, year, start_page=1, nav=None):
     """
-    Scrapes all patients with disposition == 'Pending' from WRMD in specified year (as a string)
-    Returns a list of dicts with patient data: case_number, species, date_admitted, and age_stage.
+    Scrapes all patients with disposition == 'Pending' from WRMD in specified year (as a string),
+    yielding one ScrapedRow (with age_stage filled in) per patient as soon as its row has been parsed.
+    start_page lets an interrupted backfill resume from a later page.
     """
-    results = []
+    if nav is None:
+        nav = Navigator(driver, wait, relogin=lambda: login_to_wrmd(driver, wait))
 
-    driver.get(PATIENT_LIST_URL)
-    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'table.table')))
+    nav.load(PATIENT_LIST_URL)
     time.sleep(2)
 
     PATIENT_LIST_URL_Year = PATIENT_LIST_URL + "?change_year_to=" + year
-    driver.get(PATIENT_LIST_URL_Year)
-    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'table.table')))
+    nav.load(PATIENT_LIST_URL_Year)
     time.sleep(2)
 
     # Determine total pages
@@ -106,79 +170,41 @@ def get_pending_patients(driver, wait, year):
     print(f"Total pages: {total_pages}")
 
     # Determine page order
-    page_range = range(1, total_pages + 1)
-    # Debug mode: only check the last page
+    page_range = range(start_page, total_pages + 1)
 
     for page in page_range:
         print(f"Processing page {page}...")
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'table.table')))
-        time.sleep(1)
-
-        rows = driver.find_elements(By.CSS_SELECTOR, "table.table tbody tr")
-        for row in rows:
+        if page > 1 or nav.last_url != PATIENT_LIST_URL_Year:
             try:
-                cells = row.find_elements(By.TAG_NAME, "td")
-            except Exception:
+                nav.load(f"{PATIENT_LIST_URL_Year}&page={page}")
+            except NavigationError as e:
+                print(f"❌ Skipping page {page}: {e}")
                 continue
-            if len(cells) < 9:
-                print(f"⚠️ Row has only {len(cells)} columns. Proceeding anyway.")
+        time.sleep(1)
 
+        # Detail pages open in this tab, so read the whole list before visiting any of them
+        for row_data, href in snapshot_rows(nav.driver, page, min_cells=5):
             try:
-                case_number = cells[1].text.strip()
-                species_name = cells[2].text.strip()
-                disposition = cells[4].text.strip()
-                date_admitted_str = cells[8].text.strip()  # last column is Date Admitted
-
-                try:
-                    date_admitted = datetime.strptime(date_admitted_str, "%m/%d/%Y")
-                except ValueError:
-                    print(f"⚠️ Skipping row {case_number} due to invalid date: {date_admitted_str}")
+                case_number = row_data.case_number
+
+                if row_data.date_admitted is None:
+                    print(f"⚠️ Skipping row {case_number} due to invalid admission date")
                     continue
 
-                if disposition.lower() == "pending":
-                    link = cells[2].find_element(By.TAG_NAME, "a")  # link is in species column
-                    link.send_keys(Keys.COMMAND + Keys.RETURN)  # or Keys.COMMAND on Mac
-                    time.sleep(2)
-                    driver.switch_to.window(driver.window_handles[-1])
-
-                    # Click the "Initial Care" tab
-                    selected_age_stage = None
-                    try:
-                        initial_care_link = driver.find_element(By.PARTIAL_LINK_TEXT, "Initial Care")
-                        initial_care_link.click()
-                        time.sleep(2)
-                    except Exception as e:
-                        print(f"⚠️ Failed to click 'Initial Care': {e}")
-
-                    # Extract age stage from Initial Care tab
-                    try:
-                        age_stage_select = driver.find_element(By.NAME, "exams[age_unit]")
-                        selected_age_stage = age_stage_select.find_element(By.CSS_SELECTOR, "option:checked").text.strip()
-                    except Exception as e:
-                        print(f"⚠️ Failed to extract age stage: {e}")
-
-                    print(f"Added pending patient: Case #{case_number}, Species: {species_name}, Age: {selected_age_stage}, Date Admitted: {date_admitted.strftime('%Y-%m-%d')}")
-                    results.append({
-                        "case_number": case_number,
-                        "species": species_name,
-                        "date_admitted": date_admitted,
-                        "age_stage": selected_age_stage,
-                        "page_number": page
-                    })
-
-                    driver.close()
-                    driver.switch_to.window(driver.window_handles[0])
+                if row_data.is_pending:
+                    selected_age_stage = read_age_stage(nav, href)
+                    print(f"Added pending patient: Case #{case_number}, Species: {row_data.species}, Age: {selected_age_stage}, Date Admitted: {row_data.date_admitted.isoformat()}")
+                    yield replace(row_data, age_stage=selected_age_stage)
 
+            except CircuitOpenError:
+                raise
             except Exception as e:
                 print(f"⚠️ Error handling row: {e}")
 
-        # Go to next/prev page
-        if page < total_pages:
-            pagination_links = driver.find_elements(By.CSS_SELECTOR, 'ul.pagination li a[href^="#"]')
-            for p in pagination_links:
-                if p.text.strip() == str(page + 1):
-                    driver.execute_script("arguments[0].click();", p)
-                    break
-            time.sleep(1)
 
-    return results
\ No newline at end of file
+def get_pending_patients(driver, wait, year):
+    """
+    Scrapes all patients with disposition == 'Pending' from WRMD in specified year (as a string)
+    Returns a list of ScrapedRow with case_number, species, date_admitted, age_stage and page_number.
+    """
+    return list(iter_pending_patients(driver, wait, year))
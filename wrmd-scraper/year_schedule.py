@@ -0,0 +1,71 @@
+import os
+from datetime import datetime, timezone
+
+# The current WRMD year and the one before it are walked on every run
+ACTIVE_YEARS = int(os.environ.get("WRMD_ACTIVE_YEARS", "2"))
+# Older years that still have patients are walked at most this often
+DORMANT_RECHECK_HOURS = float(os.environ.get("WRMD_DORMANT_RECHECK_HOURS", "24"))
+YEAR_CHECKS_DOC = ("system", "year_checks")
+# Set by migrate_patient_years.py once every patient document carries the indexed year field
+YEARS_MIGRATED_DOC = ("system", "patient_years")
+
+
+def year_prefix(year):
+    return f"{year % 100:02d}"
+
+
+def prefix_year(prefix):
+    """
+    Admission year of a YY prefix ("25" -> 2025); None for anything else.
+    """
+    return 2000 + int(prefix) if len(prefix) == 2 and prefix.isdigit() else None
+
+
+def active_prefixes(current_year, active_years=ACTIVE_YEARS):
+    return {year_prefix(current_year - offset) for offset in range(max(1, active_years))}
+
+
+def years_migrated(db):
+    """
+    True once system/patient_years says the year field can be queried on.
+    """
+    snapshot = db.collection(YEARS_MIGRATED_DOC[0]).document(YEARS_MIGRATED_DOC[1]).get()
+    return bool(snapshot.exists and snapshot.get("migrated"))
+
+
+def read_year_checks(db):
+    """
+    Returns {year prefix: datetime of the last completed walk} from system/year_checks.
+    """
+    snapshot = db.collection(YEAR_CHECKS_DOC[0]).document(YEAR_CHECKS_DOC[1]).get()
+    return dict(snapshot.get("checked") or {}) if snapshot.exists else {}
+
+
+def select_years(db, year_prefixes, current_year, now=None):
+    """
+    Splits the year prefixes that have patients into (years to walk this run, dormant years skipped).
+    Active years are always walked; a dormant year only once DORMANT_RECHECK_HOURS have passed
+    since its last completed walk. The current year is walked even when it has no patients yet.
+    """
+    now = now or datetime.now(timezone.utc)
+    active = active_prefixes(current_year)
+    checked = read_year_checks(db)
+
+    due, skipped = [], []
+    for prefix in sorted(set(year_prefixes) | {year_prefix(current_year)}):
+        last = checked.get(prefix)
+        if prefix in active or last is None or (now - last).total_seconds() >= DORMANT_RECHECK_HOURS * 3600:
+            due.append(prefix)
+        else:
+            skipped.append(prefix)
+    return due, skipped
+
+
+def mark_years_checked(db, year_prefixes, now=None):
+    """
+    Records a completed walk of these years in system/year_checks.
+    """
+    now = now or datetime.now(timezone.utc)
+    checked = read_year_checks(db)
+    checked.update({prefix: now for prefix in year_prefixes})
+    db.collection(YEAR_CHECKS_DOC[0]).document(YEAR_CHECKS_DOC[1]).set({"checked": checked, "updated_at": now})